@@ -0,0 +1,198 @@
+import argparse
+import concurrent.futures
+import json
+import os
+import sys
+import time
+from itertools import islice
+
+import numpy as np
+
+import chess
+import evaluation
+import pgn
+
+
+GAME_TAGS = ["Event", "Date", "White", "Black", "Result"]
+
+
+def analyze_game(pgn_game):
+    """
+    Replays a game and records every position of it
+        Parameters:
+            pgn_game (pgn.PGNGame): The game
+        Returns:
+            (dict): Tags of the game, and for every position (including the final one) the number of legal moves,
+                whether the side to move is in check, the material imbalance and the evaluation in centipawns
+                (see evaluation.evaluate_batch); then the final condition (None if the game has an error
+                in its last position). If a move can't be played or a position is invalid (like a FEN tag
+                without a king), "error" describes it and the positions end before it
+    """
+    res = {tag: pgn_game.headers.get(tag, "?") for tag in GAME_TAGS}
+    legal_moves, checks, imbalances, boards = [], [], [], []
+    error = condition = None
+    try:
+        state = pgn_game.get_start_state()
+        for ply in range(len(pgn_game.moves) + 1):
+            # Everything is computed before anything is recorded, so the lists stay aligned if it fails
+            position = (len(state.get_possible_moves()), state.is_check(), state.get_imbalance(), state.get_codes())
+            for values, value in zip((legal_moves, checks, imbalances, boards), position):
+                values.append(value)
+            if ply == len(pgn_game.moves):
+                break
+            try:
+                # The legal moves are already generated, so validating the move costs almost nothing
+                state.push(state.parse_san(pgn_game.moves[ply]))
+            except (chess.BadMoveError, ValueError) as exc:
+                error = f"ply {ply + 1}: {exc}"
+                break
+        condition = state.condition.value
+    except Exception as exc:
+        # A bad FEN tag raises ValueError, a position without a king a plain Exception
+        error = f"ply {len(legal_moves)}: {exc}" if legal_moves else f"start position: {exc}"
+    res.update({
+        "plies": max(0, len(legal_moves) - 1),
+        "legal_moves": legal_moves,
+        "checks": checks,
+        "imbalance": imbalances,
+        # All positions of the game are evaluated with one call
+        "evaluation": evaluation.evaluate_batch(
+            np.frombuffer(b"".join(boards), dtype=np.uint8).reshape(-1, 64)
+        ).tolist(),
+        "condition": condition,
+        "error": error
+    })
+    return res
+
+
+def analyze_games(pgn_games):
+    return [analyze_game(pgn_game) for pgn_game in pgn_games]
+
+
+class JSONLWriter:
+    """Writes one JSON object per game and line"""
+    def __init__(self, path):
+        self.file = open(path, "w")
+
+    def write(self, results):
+        for res in results:
+            self.file.write(json.dumps(res) + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+class NPZWriter:
+    """
+    Writes the results column by column: every batch of games becomes one .npz file in the output directory.
+    Per position columns (legal_moves, checks, imbalance, evaluation) are concatenated over the games of a file,
+    game i owns the positions ply_offsets[i]:ply_offsets[i + 1]
+    """
+    def __init__(self, path, batch_size=10000):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.batch_size = batch_size
+        self.results = []
+        self.parts = 0
+
+    def write(self, results):
+        self.results.extend(results)
+        while len(self.results) >= self.batch_size:
+            self._flush(self.results[:self.batch_size])
+            self.results = self.results[self.batch_size:]
+
+    def _flush(self, results):
+        columns = {tag: np.array([res[tag] for res in results], dtype=str) for tag in GAME_TAGS}
+        columns["condition"] = np.array([res["condition"] or "" for res in results], dtype=str)
+        columns["error"] = np.array([res["error"] or "" for res in results], dtype=str)
+        columns["plies"] = np.array([res["plies"] for res in results], dtype=np.int32)
+        columns["ply_offsets"] = np.cumsum([0] + [len(res["legal_moves"]) for res in results], dtype=np.int64)
+        columns["legal_moves"] = np.array(
+            [n for res in results for n in res["legal_moves"]], dtype=np.uint8
+        )
+        columns["checks"] = np.array([c for res in results for c in res["checks"]], dtype=bool)
+        columns["imbalance"] = np.array([i for res in results for i in res["imbalance"]], dtype=np.int16)
+        columns["evaluation"] = np.array([e for res in results for e in res["evaluation"]], dtype=np.int32)
+        np.savez(os.path.join(self.path, f"part-{self.parts:05d}.npz"), **columns)
+        self.parts += 1
+
+    def close(self):
+        if self.results:
+            self._flush(self.results)
+            self.results = []
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+
+def run(pgn_path, writer, processes=None, chunk_size=100, verbose=True):
+    """
+    Analyzes all games of a PGN file in a process pool, writing the results in the order of the file.
+    Only a few chunks of games per process are read ahead, so memory use doesn't grow with the file
+        Parameters:
+            pgn_path (str): PGN file
+            writer (JSONLWriter or NPZWriter): Where to write the results
+            processes (int): Number of worker processes (by default one per CPU)
+            chunk_size (int): Number of games sent to a worker at once
+        Returns:
+            (dict): Number of games, plies and errors, time taken and throughput
+    """
+    processes = processes or os.cpu_count()
+    start = time.perf_counter()
+    games = plies = errors = 0
+    last_report = start
+    with open(pgn_path) as file, concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+        chunks = _chunks(pgn.read_games(file), chunk_size)
+        pending = []
+        for chunk in islice(chunks, 2*processes):
+            pending.append(executor.submit(analyze_games, chunk))
+        while pending:
+            results = pending.pop(0).result()
+            chunk = next(chunks, None)
+            if chunk is not None:
+                pending.append(executor.submit(analyze_games, chunk))
+            writer.write(results)
+            games += len(results)
+            plies += sum(res["plies"] for res in results)
+            errors += sum(res["error"] is not None for res in results)
+            now = time.perf_counter()
+            if verbose and now - last_report > 5:
+                print(f"{games} games, {games/(now - start):.1f} games/s, {plies/(now - start):.0f} plies/s",
+                      file=sys.stderr)
+                last_report = now
+    writer.close()
+    seconds = time.perf_counter() - start
+    return {
+        "games": games,
+        "plies": plies,
+        "errors": errors,
+        "seconds": seconds,
+        "games_per_second": games / seconds if seconds > 0 else None,
+        "plies_per_second": plies / seconds if seconds > 0 else None
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch analysis of the games of a PGN file")
+    parser.add_argument("pgn", help="PGN file to analyze")
+    parser.add_argument("output", help="JSONL file, or a directory for the npz format")
+    parser.add_argument("--format", choices=["jsonl", "npz"], default="jsonl", help="output format")
+    parser.add_argument("--processes", type=int, help="number of worker processes (default: one per CPU)")
+    parser.add_argument("--chunk-size", type=int, default=100, help="games sent to a worker at once")
+    args = parser.parse_args(argv)
+
+    writer = JSONLWriter(args.output) if args.format == "jsonl" else NPZWriter(args.output)
+    stats = run(args.pgn, writer, processes=args.processes, chunk_size=args.chunk_size)
+    print(f"{stats['games']} games ({stats['errors']} with errors), {stats['plies']} plies "
+          f"in {stats['seconds']:.2f}s: {stats['games_per_second']:.1f} games/s, "
+          f"{stats['plies_per_second']:.0f} plies/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
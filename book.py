@@ -0,0 +1,211 @@
+import argparse
+import mmap
+import os
+import random
+import struct
+import sys
+
+import chess
+import pgn
+
+
+# An entry of a Polyglot book: position key, move, weight and learn data, big-endian.
+# The entries are sorted by key, so the moves of a position are next to each other
+ENTRY = struct.Struct(">QHHI")
+# Promoted piece of a Polyglot move (0 for none), this engine always promotes to a queen
+POLYGLOT_QUEEN = 4
+
+
+def encode_move(state: chess.State, move):
+    """
+    Returns a move in the Polyglot encoding: bits 0-5 the target square, bits 6-11 the start square
+    (file + 8*row, rows counted from the bottom), bits 12-14 the promoted piece.
+    Castling is written as the king taking its own rook
+    """
+    x1, y1, x2, y2 = move
+    code = state.board[x1, y1].code
+    kind = code & chess.KIND_MASK
+    if kind == chess.KING and abs(y2 - y1) == 2:
+        y2 = 7 if y2 > y1 else 0
+    promotion = POLYGLOT_QUEEN if kind == chess.PAWN and x2 in (0, 7) else 0
+    return promotion << 12 | (8*(7 - x1) + y1) << 6 | 8*(7 - x2) + y2
+
+
+def decode_move(state: chess.State, raw_move):
+    """
+    Returns the move of the engine for a Polyglot move, or None if the engine can't play it
+    (underpromotions). The move isn't checked to be legal
+    """
+    y2, x2 = raw_move & 7, 7 - (raw_move >> 3 & 7)
+    y1, x1 = raw_move >> 6 & 7, 7 - (raw_move >> 9 & 7)
+    promotion = raw_move >> 12 & 7
+    if promotion not in (0, POLYGLOT_QUEEN):
+        return None
+    code = state.board[x1, y1].code
+    if code & chess.KIND_MASK == chess.KING and y1 == 4:
+        if state.board[x2, y2].code == chess.ROOK | code & chess.BLACK_BIT:
+            y2 = 6 if y2 == 7 else 2
+    return chess.ALL_MOVES[(x1*8 + y1)*64 + x2*8 + y2]
+
+
+class OpeningBook:
+    """
+    Polyglot opening book, memory-mapped so that opening it is instant and only the pages which are
+    looked at are read. A position is found with a binary search over the entries
+    """
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        size = os.fstat(self.file.fileno()).st_size
+        if size % ENTRY.size != 0:
+            self.file.close()
+            raise ValueError(f"{path} is not a Polyglot book: its size isn't a multiple of {ENTRY.size}")
+        # An empty file can't be mapped
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size > 0 else b""
+        self.size = size // ENTRY.size
+
+    def __len__(self):
+        return self.size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+    def _find_first(self, key):
+        """Returns the index of the first entry with a key which isn't smaller than the given one"""
+        low, high = 0, self.size
+        while low < high:
+            mid = (low + high) // 2
+            if struct.unpack_from(">Q", self.data, mid*ENTRY.size)[0] < key:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def get_entries(self, state: chess.State, validate=True):
+        """
+        Looks up a position
+            Parameters:
+                validate (bool): Whether to leave out moves which aren't legal in the position
+                    (they can only come from a broken book or a hash collision)
+            Returns:
+                ([(chess.Move, int)]) (list): The book moves of the position with their weights,
+                    in the order of the book (usually the best first)
+        """
+        key = state.zobrist_key
+        entries = []
+        ind = self._find_first(key)
+        while ind < self.size:
+            entry_key, raw_move, weight, learn = ENTRY.unpack_from(self.data, ind*ENTRY.size)
+            if entry_key != key:
+                break
+            move = decode_move(state, raw_move)
+            if move is not None and (not validate or state.is_valid_move(move)):
+                entries.append((move, weight))
+            ind += 1
+        return entries
+
+    def find_move(self, state: chess.State, best=False):
+        """
+        Chooses a book move for a position
+            Parameters:
+                best (bool): Whether to play the move with the highest weight, by default a move is chosen
+                    randomly in proportion to the weights
+            Returns:
+                (chess.Move): The move, or None if the position isn't in the book
+        """
+        entries = [(move, weight) for move, weight in self.get_entries(state, validate=False) if weight > 0]
+        if len(entries) == 0:
+            return None
+        if best:
+            move = max(entries, key=lambda entry: entry[1])[0]
+        else:
+            move = random.choices([move for move, _ in entries], weights=[weight for _, weight in entries])[0]
+        # Only the chosen move is checked, which is much faster than checking all of them
+        return move if state.is_valid_move(move) else None
+
+
+GAME_POINTS = {"1-0": (2, 0), "0-1": (0, 2), "1/2-1/2": (1, 1)}
+
+
+def build_book(pgn_paths, path, max_plies=20, min_games=1):
+    """
+    Creates a Polyglot book from the games of PGN files. The weight of a move is the number of points
+    it scored for the side which played it (2 for a win, 1 for a draw), games without a result are skipped
+        Parameters:
+            pgn_paths ([str]): PGN files
+            path (str): Book file to write
+            max_plies (int): Only the first plies of every game are put in the book
+            min_games (int): Moves played in fewer games are left out
+        Returns:
+            (dict): Number of games used, positions and entries written
+    """
+    moves = {}  # (key, raw move) -> [games, points]
+    games = 0
+    for pgn_path in pgn_paths:
+        with open(pgn_path) as file:
+            for pgn_game in pgn.read_games(file):
+                if pgn_game.result not in GAME_POINTS:
+                    continue
+                games += 1
+                white_points, black_points = GAME_POINTS[pgn_game.result]
+                state = pgn_game.get_start_state()
+                for san in pgn_game.moves[:max_plies]:
+                    try:
+                        move = state.parse_san(san, validate=False)
+                    except (chess.BadMoveError, ValueError):
+                        break
+                    counts = moves.setdefault((state.zobrist_key, encode_move(state, move)), [0, 0])
+                    counts[0] += 1
+                    counts[1] += white_points if state.color_to_move == chess.Color.WHITE else black_points
+                    state.push(move)
+
+    entries = [(key, raw_move, points) for (key, raw_move), (n, points) in moves.items() if n >= min_games]
+    # Weights have to fit into 16 bits
+    scale = min(1.0, 0xFFFF / max((points for _, _, points in entries), default=1))
+    entries.sort(key=lambda entry: (entry[0], -entry[2], entry[1]))
+    with open(path, "wb") as file:
+        for key, raw_move, points in entries:
+            file.write(ENTRY.pack(key, raw_move, int(points * scale), 0))
+    return {"games": games, "positions": len({entry[0] for entry in entries}), "entries": len(entries)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Polyglot opening books")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="create a book from PGN files")
+    build_parser.add_argument("book", help="book file to write")
+    build_parser.add_argument("pgn", nargs="+", help="PGN files")
+    build_parser.add_argument("--plies", type=int, default=20, help="plies of every game put in the book")
+    build_parser.add_argument("--min-games", type=int, default=1, help="games a move has to be played in")
+    probe_parser = subparsers.add_parser("probe", help="print the book moves of a position")
+    probe_parser.add_argument("book", help="book file")
+    probe_parser.add_argument("fen", nargs="?", help="position (default: the initial one)")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        stats = build_book(args.pgn, args.book, max_plies=args.plies, min_games=args.min_games)
+        print(f"{stats['games']} games: {stats['positions']} positions, {stats['entries']} entries")
+        return 0
+
+    state = chess.State.from_fen(args.fen) if args.fen else chess.State("initial")
+    with OpeningBook(args.book) as book:
+        entries = book.get_entries(state)
+    total = sum(weight for _, weight in entries)
+    for move, weight in entries:
+        share = weight / total if total > 0 else 0.0
+        print(f"{state.move_to_san(move):<8} {weight:>6} {share:7.1%}")
+    if len(entries) == 0:
+        print("Not in the book")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,17 @@
 # flake8: noqa
-import numpy as np
+import re
+import threading
+import time
+from collections.abc import MutableMapping, MutableSequence
 from enum import Enum
-from copy import deepcopy
 import pygame
 from pygame.locals import (
     KEYDOWN,
     K_ESCAPE,
     QUIT,
     MOUSEBUTTONUP,
-    MOUSEBUTTONDOWN
+    MOUSEBUTTONDOWN,
+    VIDEOEXPOSE
 )
 
 
@@ -111,6 +114,309 @@ class Piece:
         elif kind == Kind.KING:
             return "K"
 
+    @property
+    def code(self):
+        """Code of the piece on the compact board of State"""
+        return KIND_CODES[self.kind] | COLOR_CODES[self.color]
+
+
+# Piece codes of the compact board: the kind in the lower 3 bits, the color in the 4th one
+EMPTY = 0
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(1, 7)
+KIND_MASK = 7
+BLACK_BIT = 8
+
+KIND_CODES = {
+    Kind.EMPTY: EMPTY,
+    Kind.PAWN: PAWN,
+    Kind.KNIGHT: KNIGHT,
+    Kind.BISHOP: BISHOP,
+    Kind.ROOK: ROOK,
+    Kind.QUEEN: QUEEN,
+    Kind.KING: KING
+}
+COLOR_CODES = {Color.NONE: 0, Color.WHITE: 0, Color.BLACK: BLACK_BIT}
+SIDE_COLORS = {0: Color.WHITE, BLACK_BIT: Color.BLACK}
+
+# One shared Piece for every code, so that reading the board doesn't create objects
+PIECES = [None] * 16
+for _kind, _kind_code in KIND_CODES.items():
+    if _kind == Kind.EMPTY:
+        PIECES[EMPTY] = Piece(_kind)
+        continue
+    for _color in [Color.WHITE, Color.BLACK]:
+        PIECES[_kind_code | COLOR_CODES[_color]] = Piece(_kind, _color)
+
+# FEN letters of the piece codes, and translation tables between FEN piece placement and board bytes
+FEN_CHARS = {
+    PAWN: "P", KNIGHT: "N", BISHOP: "B", ROOK: "R", QUEEN: "Q", KING: "K",
+    PAWN | BLACK_BIT: "p", KNIGHT | BLACK_BIT: "n", BISHOP | BLACK_BIT: "b",
+    ROOK | BLACK_BIT: "r", QUEEN | BLACK_BIT: "q", KING | BLACK_BIT: "k"
+}
+# Piece letters become codes, digits and "/" stay as they are, anything else becomes INVALID_CODE
+INVALID_CODE = 255
+FEN_TO_BOARD = bytearray([INVALID_CODE] * 256)
+for _code, _char in FEN_CHARS.items():
+    FEN_TO_BOARD[ord(_char)] = _code
+for _char in "12345678/":
+    FEN_TO_BOARD[ord(_char)] = ord(_char)
+FEN_TO_BOARD = bytes(FEN_TO_BOARD)
+FEN_EMPTY_RUNS = [(str(n).encode(), bytes([EMPTY] * n)) for n in range(1, 9)]
+BOARD_TO_FEN = bytes.maketrans(
+    bytes([EMPTY] + list(FEN_CHARS)), ("1" + "".join(FEN_CHARS.values())).encode()
+)
+FEN_CASTLING = {"K": 1, "Q": 2, "k": 4, "q": 8}
+
+# Long algebraic notation of UCI: start, target, promotion
+UCI_RE = re.compile(r"^[a-h][1-8][a-h][1-8][qrbn]?$")
+# Standard algebraic notation (SAN): piece letter, disambiguating file and rank, capture, target, promotion
+SAN_RE = re.compile(r"^([NBRQK])?([a-h])?([1-8])?(x)?([a-h][1-8])(?:=?([NBRQ]))?$")
+SAN_KINDS = {"N": KNIGHT, "B": BISHOP, "R": ROOK, "Q": QUEEN, "K": KING}
+
+PIECE_VALUES = {PAWN: 1, KNIGHT: 3, BISHOP: 3, ROOK: 5, QUEEN: 9, KING: 0}
+IMBALANCE_BY_CODE = [0] * 16
+for _kind_code, _value in PIECE_VALUES.items():
+    IMBALANCE_BY_CODE[_kind_code] = _value
+    IMBALANCE_BY_CODE[_kind_code | BLACK_BIT] = -_value
+# Translation tables turning the board into "1" on the squares of white (then black) pieces and "0" elsewhere,
+# which reversed and read as a binary number is the mask of the squares of that side
+OCCUPANCY_DIGITS = [
+    bytes(ord("1") if code != EMPTY and code & BLACK_BIT == side else ord("0") for code in range(256))
+    for side in (0, BLACK_BIT)
+]
+
+CASTLING_BITS = {
+    Color.WHITE: {"short": 1, "long": 2},
+    Color.BLACK: {"short": 4, "long": 8}
+}
+ALL_CASTLING = 15
+# Castling rights kept when a move starts or ends on a square: moving the king takes away both rights
+# of its color, moving a rook from its corner or capturing it there takes away the right of that rook
+CASTLING_MASKS = [ALL_CASTLING] * 64
+CASTLING_MASKS[60] &= ~(CASTLING_BITS[Color.WHITE]["short"] | CASTLING_BITS[Color.WHITE]["long"])
+CASTLING_MASKS[63] &= ~CASTLING_BITS[Color.WHITE]["short"]
+CASTLING_MASKS[56] &= ~CASTLING_BITS[Color.WHITE]["long"]
+CASTLING_MASKS[4] &= ~(CASTLING_BITS[Color.BLACK]["short"] | CASTLING_BITS[Color.BLACK]["long"])
+CASTLING_MASKS[7] &= ~CASTLING_BITS[Color.BLACK]["short"]
+CASTLING_MASKS[0] &= ~CASTLING_BITS[Color.BLACK]["long"]
+
+# Random keys for Zobrist hashing: the 781 keys of the Polyglot opening book format,
+# so that zobrist_key is the Polyglot hash of the position and can be looked up in Polyglot books.
+# Pieces use keys 0-767 (64 per kind, black before white), castling rights 768-771,
+# the en passant file 772-779 and white to move 780
+POLYGLOT_RANDOM = [
+    0x9D39247E33776D41, 0x2AF7398005AAA5C7, 0x44DB015024623547, 0x9C15F73E62A76AE2,
+    0x75834465489C0C89, 0x3290AC3A203001BF, 0x0FBBAD1F61042279, 0xE83A908FF2FB60CA,
+    0x0D7E765D58755C10, 0x1A083822CEAFE02D, 0x9605D5F0E25EC3B0, 0xD021FF5CD13A2ED5,
+    0x40BDF15D4A672E32, 0x011355146FD56395, 0x5DB4832046F3D9E5, 0x239F8B2D7FF719CC,
+    0x05D1A1AE85B49AA1, 0x679F848F6E8FC971, 0x7449BBFF801FED0B, 0x7D11CDB1C3B7ADF0,
+    0x82C7709E781EB7CC, 0xF3218F1C9510786C, 0x331478F3AF51BBE6, 0x4BB38DE5E7219443,
+    0xAA649C6EBCFD50FC, 0x8DBD98A352AFD40B, 0x87D2074B81D79217, 0x19F3C751D3E92AE1,
+    0xB4AB30F062B19ABF, 0x7B0500AC42047AC4, 0xC9452CA81A09D85D, 0x24AA6C514DA27500,
+    0x4C9F34427501B447, 0x14A68FD73C910841, 0xA71B9B83461CBD93, 0x03488B95B0F1850F,
+    0x637B2B34FF93C040, 0x09D1BC9A3DD90A94, 0x3575668334A1DD3B, 0x735E2B97A4C45A23,
+    0x18727070F1BD400B, 0x1FCBACD259BF02E7, 0xD310A7C2CE9B6555, 0xBF983FE0FE5D8244,
+    0x9F74D14F7454A824, 0x51EBDC4AB9BA3035, 0x5C82C505DB9AB0FA, 0xFCF7FE8A3430B241,
+    0x3253A729B9BA3DDE, 0x8C74C368081B3075, 0xB9BC6C87167C33E7, 0x7EF48F2B83024E20,
+    0x11D505D4C351BD7F, 0x6568FCA92C76A243, 0x4DE0B0F40F32A7B8, 0x96D693460CC37E5D,
+    0x42E240CB63689F2F, 0x6D2BDCDAE2919661, 0x42880B0236E4D951, 0x5F0F4A5898171BB6,
+    0x39F890F579F92F88, 0x93C5B5F47356388B, 0x63DC359D8D231B78, 0xEC16CA8AEA98AD76,
+    0x5355F900C2A82DC7, 0x07FB9F855A997142, 0x5093417AA8A7ED5E, 0x7BCBC38DA25A7F3C,
+    0x19FC8A768CF4B6D4, 0x637A7780DECFC0D9, 0x8249A47AEE0E41F7, 0x79AD695501E7D1E8,
+    0x14ACBAF4777D5776, 0xF145B6BECCDEA195, 0xDABF2AC8201752FC, 0x24C3C94DF9C8D3F6,
+    0xBB6E2924F03912EA, 0x0CE26C0B95C980D9, 0xA49CD132BFBF7CC4, 0xE99D662AF4243939,
+    0x27E6AD7891165C3F, 0x8535F040B9744FF1, 0x54B3F4FA5F40D873, 0x72B12C32127FED2B,
+    0xEE954D3C7B411F47, 0x9A85AC909A24EAA1, 0x70AC4CD9F04F21F5, 0xF9B89D3E99A075C2,
+    0x87B3E2B2B5C907B1, 0xA366E5B8C54F48B8, 0xAE4A9346CC3F7CF2, 0x1920C04D47267BBD,
+    0x87BF02C6B49E2AE9, 0x092237AC237F3859, 0xFF07F64EF8ED14D0, 0x8DE8DCA9F03CC54E,
+    0x9C1633264DB49C89, 0xB3F22C3D0B0B38ED, 0x390E5FB44D01144B, 0x5BFEA5B4712768E9,
+    0x1E1032911FA78984, 0x9A74ACB964E78CB3, 0x4F80F7A035DAFB04, 0x6304D09A0B3738C4,
+    0x2171E64683023A08, 0x5B9B63EB9CEFF80C, 0x506AACF489889342, 0x1881AFC9A3A701D6,
+    0x6503080440750644, 0xDFD395339CDBF4A7, 0xEF927DBCF00C20F2, 0x7B32F7D1E03680EC,
+    0xB9FD7620E7316243, 0x05A7E8A57DB91B77, 0xB5889C6E15630A75, 0x4A750A09CE9573F7,
+    0xCF464CEC899A2F8A, 0xF538639CE705B824, 0x3C79A0FF5580EF7F, 0xEDE6C87F8477609D,
+    0x799E81F05BC93F31, 0x86536B8CF3428A8C, 0x97D7374C60087B73, 0xA246637CFF328532,
+    0x043FCAE60CC0EBA0, 0x920E449535DD359E, 0x70EB093B15B290CC, 0x73A1921916591CBD,
+    0x56436C9FE1A1AA8D, 0xEFAC4B70633B8F81, 0xBB215798D45DF7AF, 0x45F20042F24F1768,
+    0x930F80F4E8EB7462, 0xFF6712FFCFD75EA1, 0xAE623FD67468AA70, 0xDD2C5BC84BC8D8FC,
+    0x7EED120D54CF2DD9, 0x22FE545401165F1C, 0xC91800E98FB99929, 0x808BD68E6AC10365,
+    0xDEC468145B7605F6, 0x1BEDE3A3AEF53302, 0x43539603D6C55602, 0xAA969B5C691CCB7A,
+    0xA87832D392EFEE56, 0x65942C7B3C7E11AE, 0xDED2D633CAD004F6, 0x21F08570F420E565,
+    0xB415938D7DA94E3C, 0x91B859E59ECB6350, 0x10CFF333E0ED804A, 0x28AED140BE0BB7DD,
+    0xC5CC1D89724FA456, 0x5648F680F11A2741, 0x2D255069F0B7DAB3, 0x9BC5A38EF729ABD4,
+    0xEF2F054308F6A2BC, 0xAF2042F5CC5C2858, 0x480412BAB7F5BE2A, 0xAEF3AF4A563DFE43,
+    0x19AFE59AE451497F, 0x52593803DFF1E840, 0xF4F076E65F2CE6F0, 0x11379625747D5AF3,
+    0xBCE5D2248682C115, 0x9DA4243DE836994F, 0x066F70B33FE09017, 0x4DC4DE189B671A1C,
+    0x51039AB7712457C3, 0xC07A3F80C31FB4B4, 0xB46EE9C5E64A6E7C, 0xB3819A42ABE61C87,
+    0x21A007933A522A20, 0x2DF16F761598AA4F, 0x763C4A1371B368FD, 0xF793C46702E086A0,
+    0xD7288E012AEB8D31, 0xDE336A2A4BC1C44B, 0x0BF692B38D079F23, 0x2C604A7A177326B3,
+    0x4850E73E03EB6064, 0xCFC447F1E53C8E1B, 0xB05CA3F564268D99, 0x9AE182C8BC9474E8,
+    0xA4FC4BD4FC5558CA, 0xE755178D58FC4E76, 0x69B97DB1A4C03DFE, 0xF9B5B7C4ACC67C96,
+    0xFC6A82D64B8655FB, 0x9C684CB6C4D24417, 0x8EC97D2917456ED0, 0x6703DF9D2924E97E,
+    0xC547F57E42A7444E, 0x78E37644E7CAD29E, 0xFE9A44E9362F05FA, 0x08BD35CC38336615,
+    0x9315E5EB3A129ACE, 0x94061B871E04DF75, 0xDF1D9F9D784BA010, 0x3BBA57B68871B59D,
+    0xD2B7ADEEDED1F73F, 0xF7A255D83BC373F8, 0xD7F4F2448C0CEB81, 0xD95BE88CD210FFA7,
+    0x336F52F8FF4728E7, 0xA74049DAC312AC71, 0xA2F61BB6E437FDB5, 0x4F2A5CB07F6A35B3,
+    0x87D380BDA5BF7859, 0x16B9F7E06C453A21, 0x7BA2484C8A0FD54E, 0xF3A678CAD9A2E38C,
+    0x39B0BF7DDE437BA2, 0xFCAF55C1BF8A4424, 0x18FCF680573FA594, 0x4C0563B89F495AC3,
+    0x40E087931A00930D, 0x8CFFA9412EB642C1, 0x68CA39053261169F, 0x7A1EE967D27579E2,
+    0x9D1D60E5076F5B6F, 0x3810E399B6F65BA2, 0x32095B6D4AB5F9B1, 0x35CAB62109DD038A,
+    0xA90B24499FCFAFB1, 0x77A225A07CC2C6BD, 0x513E5E634C70E331, 0x4361C0CA3F692F12,
+    0xD941ACA44B20A45B, 0x528F7C8602C5807B, 0x52AB92BEB9613989, 0x9D1DFA2EFC557F73,
+    0x722FF175F572C348, 0x1D1260A51107FE97, 0x7A249A57EC0C9BA2, 0x04208FE9E8F7F2D6,
+    0x5A110C6058B920A0, 0x0CD9A497658A5698, 0x56FD23C8F9715A4C, 0x284C847B9D887AAE,
+    0x04FEABFBBDB619CB, 0x742E1E651C60BA83, 0x9A9632E65904AD3C, 0x881B82A13B51B9E2,
+    0x506E6744CD974924, 0xB0183DB56FFC6A79, 0x0ED9B915C66ED37E, 0x5E11E86D5873D484,
+    0xF678647E3519AC6E, 0x1B85D488D0F20CC5, 0xDAB9FE6525D89021, 0x0D151D86ADB73615,
+    0xA865A54EDCC0F019, 0x93C42566AEF98FFB, 0x99E7AFEABE000731, 0x48CBFF086DDF285A,
+    0x7F9B6AF1EBF78BAF, 0x58627E1A149BBA21, 0x2CD16E2ABD791E33, 0xD363EFF5F0977996,
+    0x0CE2A38C344A6EED, 0x1A804AADB9CFA741, 0x907F30421D78C5DE, 0x501F65EDB3034D07,
+    0x37624AE5A48FA6E9, 0x957BAF61700CFF4E, 0x3A6C27934E31188A, 0xD49503536ABCA345,
+    0x088E049589C432E0, 0xF943AEE7FEBF21B8, 0x6C3B8E3E336139D3, 0x364F6FFA464EE52E,
+    0xD60F6DCEDC314222, 0x56963B0DCA418FC0, 0x16F50EDF91E513AF, 0xEF1955914B609F93,
+    0x565601C0364E3228, 0xECB53939887E8175, 0xBAC7A9A18531294B, 0xB344C470397BBA52,
+    0x65D34954DAF3CEBD, 0xB4B81B3FA97511E2, 0xB422061193D6F6A7, 0x071582401C38434D,
+    0x7A13F18BBEDC4FF5, 0xBC4097B116C524D2, 0x59B97885E2F2EA28, 0x99170A5DC3115544,
+    0x6F423357E7C6A9F9, 0x325928EE6E6F8794, 0xD0E4366228B03343, 0x565C31F7DE89EA27,
+    0x30F5611484119414, 0xD873DB391292ED4F, 0x7BD94E1D8E17DEBC, 0xC7D9F16864A76E94,
+    0x947AE053EE56E63C, 0xC8C93882F9475F5F, 0x3A9BF55BA91F81CA, 0xD9A11FBB3D9808E4,
+    0x0FD22063EDC29FCA, 0xB3F256D8ACA0B0B9, 0xB03031A8B4516E84, 0x35DD37D5871448AF,
+    0xE9F6082B05542E4E, 0xEBFAFA33D7254B59, 0x9255ABB50D532280, 0xB9AB4CE57F2D34F3,
+    0x693501D628297551, 0xC62C58F97DD949BF, 0xCD454F8F19C5126A, 0xBBE83F4ECC2BDECB,
+    0xDC842B7E2819E230, 0xBA89142E007503B8, 0xA3BC941D0A5061CB, 0xE9F6760E32CD8021,
+    0x09C7E552BC76492F, 0x852F54934DA55CC9, 0x8107FCCF064FCF56, 0x098954D51FFF6580,
+    0x23B70EDB1955C4BF, 0xC330DE426430F69D, 0x4715ED43E8A45C0A, 0xA8D7E4DAB780A08D,
+    0x0572B974F03CE0BB, 0xB57D2E985E1419C7, 0xE8D9ECBE2CF3D73F, 0x2FE4B17170E59750,
+    0x11317BA87905E790, 0x7FBF21EC8A1F45EC, 0x1725CABFCB045B00, 0x964E915CD5E2B207,
+    0x3E2B8BCBF016D66D, 0xBE7444E39328A0AC, 0xF85B2B4FBCDE44B7, 0x49353FEA39BA63B1,
+    0x1DD01AAFCD53486A, 0x1FCA8A92FD719F85, 0xFC7C95D827357AFA, 0x18A6A990C8B35EBD,
+    0xCCCB7005C6B9C28D, 0x3BDBB92C43B17F26, 0xAA70B5B4F89695A2, 0xE94C39A54A98307F,
+    0xB7A0B174CFF6F36E, 0xD4DBA84729AF48AD, 0x2E18BC1AD9704A68, 0x2DE0966DAF2F8B1C,
+    0xB9C11D5B1E43A07E, 0x64972D68DEE33360, 0x94628D38D0C20584, 0xDBC0D2B6AB90A559,
+    0xD2733C4335C6A72F, 0x7E75D99D94A70F4D, 0x6CED1983376FA72B, 0x97FCAACBF030BC24,
+    0x7B77497B32503B12, 0x8547EDDFB81CCB94, 0x79999CDFF70902CB, 0xCFFE1939438E9B24,
+    0x829626E3892D95D7, 0x92FAE24291F2B3F1, 0x63E22C147B9C3403, 0xC678B6D860284A1C,
+    0x5873888850659AE7, 0x0981DCD296A8736D, 0x9F65789A6509A440, 0x9FF38FED72E9052F,
+    0xE479EE5B9930578C, 0xE7F28ECD2D49EECD, 0x56C074A581EA17FE, 0x5544F7D774B14AEF,
+    0x7B3F0195FC6F290F, 0x12153635B2C0CF57, 0x7F5126DBBA5E0CA7, 0x7A76956C3EAFB413,
+    0x3D5774A11D31AB39, 0x8A1B083821F40CB4, 0x7B4A38E32537DF62, 0x950113646D1D6E03,
+    0x4DA8979A0041E8A9, 0x3BC36E078F7515D7, 0x5D0A12F27AD310D1, 0x7F9D1A2E1EBE1327,
+    0xDA3A361B1C5157B1, 0xDCDD7D20903D0C25, 0x36833336D068F707, 0xCE68341F79893389,
+    0xAB9090168DD05F34, 0x43954B3252DC25E5, 0xB438C2B67F98E5E9, 0x10DCD78E3851A492,
+    0xDBC27AB5447822BF, 0x9B3CDB65F82CA382, 0xB67B7896167B4C84, 0xBFCED1B0048EAC50,
+    0xA9119B60369FFEBD, 0x1FFF7AC80904BF45, 0xAC12FB171817EEE7, 0xAF08DA9177DDA93D,
+    0x1B0CAB936E65C744, 0xB559EB1D04E5E932, 0xC37B45B3F8D6F2BA, 0xC3A9DC228CAAC9E9,
+    0xF3B8B6675A6507FF, 0x9FC477DE4ED681DA, 0x67378D8ECCEF96CB, 0x6DD856D94D259236,
+    0xA319CE15B0B4DB31, 0x073973751F12DD5E, 0x8A8E849EB32781A5, 0xE1925C71285279F5,
+    0x74C04BF1790C0EFE, 0x4DDA48153C94938A, 0x9D266D6A1CC0542C, 0x7440FB816508C4FE,
+    0x13328503DF48229F, 0xD6BF7BAEE43CAC40, 0x4838D65F6EF6748F, 0x1E152328F3318DEA,
+    0x8F8419A348F296BF, 0x72C8834A5957B511, 0xD7A023A73260B45C, 0x94EBC8ABCFB56DAE,
+    0x9FC10D0F989993E0, 0xDE68A2355B93CAE6, 0xA44CFE79AE538BBE, 0x9D1D84FCCE371425,
+    0x51D2B1AB2DDFB636, 0x2FD7E4B9E72CD38C, 0x65CA5B96B7552210, 0xDD69A0D8AB3B546D,
+    0x604D51B25FBF70E2, 0x73AA8A564FB7AC9E, 0x1A8C1E992B941148, 0xAAC40A2703D9BEA0,
+    0x764DBEAE7FA4F3A6, 0x1E99B96E70A9BE8B, 0x2C5E9DEB57EF4743, 0x3A938FEE32D29981,
+    0x26E6DB8FFDF5ADFE, 0x469356C504EC9F9D, 0xC8763C5B08D1908C, 0x3F6C6AF859D80055,
+    0x7F7CC39420A3A545, 0x9BFB227EBDF4C5CE, 0x89039D79D6FC5C5C, 0x8FE88B57305E2AB6,
+    0xA09E8C8C35AB96DE, 0xFA7E393983325753, 0xD6B6D0ECC617C699, 0xDFEA21EA9E7557E3,
+    0xB67C1FA481680AF8, 0xCA1E3785A9E724E5, 0x1CFC8BED0D681639, 0xD18D8549D140CAEA,
+    0x4ED0FE7E9DC91335, 0xE4DBF0634473F5D2, 0x1761F93A44D5AEFE, 0x53898E4C3910DA55,
+    0x734DE8181F6EC39A, 0x2680B122BAA28D97, 0x298AF231C85BAFAB, 0x7983EED3740847D5,
+    0x66C1A2A1A60CD889, 0x9E17E49642A3E4C1, 0xEDB454E7BADC0805, 0x50B704CAB602C329,
+    0x4CC317FB9CDDD023, 0x66B4835D9EAFEA22, 0x219B97E26FFC81BD, 0x261E4E4C0A333A9D,
+    0x1FE2CCA76517DB90, 0xD7504DFA8816EDBB, 0xB9571FA04DC089C8, 0x1DDC0325259B27DE,
+    0xCF3F4688801EB9AA, 0xF4F5D05C10CAB243, 0x38B6525C21A42B0E, 0x36F60E2BA4FA6800,
+    0xEB3593803173E0CE, 0x9C4CD6257C5A3603, 0xAF0C317D32ADAA8A, 0x258E5A80C7204C4B,
+    0x8B889D624D44885D, 0xF4D14597E660F855, 0xD4347F66EC8941C3, 0xE699ED85B0DFB40D,
+    0x2472F6207C2D0484, 0xC2A1E7B5B459AEB5, 0xAB4F6451CC1D45EC, 0x63767572AE3D6174,
+    0xA59E0BD101731A28, 0x116D0016CB948F09, 0x2CF9C8CA052F6E9F, 0x0B090A7560A968E3,
+    0xABEEDDB2DDE06FF1, 0x58EFC10B06A2068D, 0xC6E57A78FBD986E0, 0x2EAB8CA63CE802D7,
+    0x14A195640116F336, 0x7C0828DD624EC390, 0xD74BBE77E6116AC7, 0x804456AF10F5FB53,
+    0xEBE9EA2ADF4321C7, 0x03219A39EE587A30, 0x49787FEF17AF9924, 0xA1E9300CD8520548,
+    0x5B45E522E4B1B4EF, 0xB49C3B3995091A36, 0xD4490AD526F14431, 0x12A8F216AF9418C2,
+    0x001F837CC7350524, 0x1877B51E57A764D5, 0xA2853B80F17F58EE, 0x993E1DE72D36D310,
+    0xB3598080CE64A656, 0x252F59CF0D9F04BB, 0xD23C8E176D113600, 0x1BDA0492E7E4586E,
+    0x21E0BD5026C619BF, 0x3B097ADAF088F94E, 0x8D14DEDB30BE846E, 0xF95CFFA23AF5F6F4,
+    0x3871700761B3F743, 0xCA672B91E9E4FA16, 0x64C8E531BFF53B55, 0x241260ED4AD1E87D,
+    0x106C09B972D2E822, 0x7FBA195410E5CA30, 0x7884D9BC6CB569D8, 0x0647DFEDCD894A29,
+    0x63573FF03E224774, 0x4FC8E9560F91B123, 0x1DB956E450275779, 0xB8D91274B9E9D4FB,
+    0xA2EBEE47E2FBFCE1, 0xD9F1F30CCD97FB09, 0xEFED53D75FD64E6B, 0x2E6D02C36017F67F,
+    0xA9AA4D20DB084E9B, 0xB64BE8D8B25396C1, 0x70CB6AF7C2D5BCF0, 0x98F076A4F7A2322E,
+    0xBF84470805E69B5F, 0x94C3251F06F90CF3, 0x3E003E616A6591E9, 0xB925A6CD0421AFF3,
+    0x61BDD1307C66E300, 0xBF8D5108E27E0D48, 0x240AB57A8B888B20, 0xFC87614BAF287E07,
+    0xEF02CDD06FFDB432, 0xA1082C0466DF6C0A, 0x8215E577001332C8, 0xD39BB9C3A48DB6CF,
+    0x2738259634305C14, 0x61CF4F94C97DF93D, 0x1B6BACA2AE4E125B, 0x758F450C88572E0B,
+    0x959F587D507A8359, 0xB063E962E045F54D, 0x60E8ED72C0DFF5D1, 0x7B64978555326F9F,
+    0xFD080D236DA814BA, 0x8C90FD9B083F4558, 0x106F72FE81E2C590, 0x7976033A39F7D952,
+    0xA4EC0132764CA04B, 0x733EA705FAE4FA77, 0xB4D8F77BC3E56167, 0x9E21F4F903B33FD9,
+    0x9D765E419FB69F6D, 0xD30C088BA61EA5EF, 0x5D94337FBFAF7F5B, 0x1A4E4822EB4D7A59,
+    0x6FFE73E81B637FB3, 0xDDF957BC36D8B9CA, 0x64D0E29EEA8838B3, 0x08DD9BDFD96B9F63,
+    0x087E79E5A57D1D13, 0xE328E230E3E2B3FB, 0x1C2559E30F0946BE, 0x720BF5F26F4D2EAA,
+    0xB0774D261CC609DB, 0x443F64EC5A371195, 0x4112CF68649A260E, 0xD813F2FAB7F5C5CA,
+    0x660D3257380841EE, 0x59AC2C7873F910A3, 0xE846963877671A17, 0x93B633ABFA3469F8,
+    0xC0C0F5A60EF4CDCF, 0xCAF21ECD4377B28C, 0x57277707199B8175, 0x506C11B9D90E8B1D,
+    0xD83CC2687A19255F, 0x4A29C6465A314CD1, 0xED2DF21216235097, 0xB5635C95FF7296E2,
+    0x22AF003AB672E811, 0x52E762596BF68235, 0x9AEBA33AC6ECC6B0, 0x944F6DE09134DFB6,
+    0x6C47BEC883A7DE39, 0x6AD047C430A12104, 0xA5B1CFDBA0AB4067, 0x7C45D833AFF07862,
+    0x5092EF950A16DA0B, 0x9338E69C052B8E7B, 0x455A4B4CFE30E3F5, 0x6B02E63195AD0CF8,
+    0x6B17B224BAD6BF27, 0xD1E0CCD25BB9C169, 0xDE0C89A556B9AE70, 0x50065E535A213CF6,
+    0x9C1169FA2777B874, 0x78EDEFD694AF1EED, 0x6DC93D9526A50E68, 0xEE97F453F06791ED,
+    0x32AB0EDB696703D3, 0x3A6853C7E70757A7, 0x31865CED6120F37D, 0x67FEF95D92607890,
+    0x1F2B1D1F15F6DC9C, 0xB69E38A8965C6B65, 0xAA9119FF184CCCF4, 0xF43C732873F24C13,
+    0xFB4A3D794A9A80D2, 0x3550C2321FD6109C, 0x371F77E76BB8417E, 0x6BFA9AAE5EC05779,
+    0xCD04F3FF001A4778, 0xE3273522064480CA, 0x9F91508BFFCFC14A, 0x049A7F41061A9E60,
+    0xFCB6BE43A9F2FE9B, 0x08DE8A1C7797DA9B, 0x8F9887E6078735A1, 0xB5B4071DBFC73A66,
+    0x230E343DFBA08D33, 0x43ED7F5A0FAE657D, 0x3A88A0FBBCB05C63, 0x21874B8B4D2DBC4F,
+    0x1BDEA12E35F6A8C9, 0x53C065C6C8E63528, 0xE34A1D250E7A8D6B, 0xD6B04D3B7651DD7E,
+    0x5E90277E7CB39E2D, 0x2C046F22062DC67D, 0xB10BB459132D0A26, 0x3FA9DDFB67E2F199,
+    0x0E09B88E1914F7AF, 0x10E8B35AF3EEAB37, 0x9EEDECA8E272B933, 0xD4C718BC4AE8AE5F,
+    0x81536D601170FC20, 0x91B534F885818A06, 0xEC8177F83F900978, 0x190E714FADA5156E,
+    0xB592BF39B0364963, 0x89C350C893AE7DC1, 0xAC042E70F8B383F2, 0xB49B52E587A1EE60,
+    0xFB152FE3FF26DA89, 0x3E666E6F69AE2C15, 0x3B544EBE544C19F9, 0xE805A1E290CF2456,
+    0x24B33C9D7ED25117, 0xE74733427B72F0C1, 0x0A804D18B7097475, 0x57E3306D881EDB4F,
+    0x4AE7D6A36EB5DBCB, 0x2D8D5432157064C8, 0xD1E649DE1E7F268B, 0x8A328A1CEDFE552C,
+    0x07A3AEC79624C7DA, 0x84547DDC3E203C94, 0x990A98FD5071D263, 0x1A4FF12616EEFC89,
+    0xF6F7FD1431714200, 0x30C05B1BA332F41C, 0x8D2636B81555A786, 0x46C9FEB55D120902,
+    0xCCEC0A73B49C9921, 0x4E9D2827355FC492, 0x19EBB029435DCB0F, 0x4659D2B743848A2C,
+    0x963EF2C96B33BE31, 0x74F85198B05A2E7D, 0x5A0F544DD2B1FB18, 0x03727073C2E134B1,
+    0xC7F6AA2DE59AEA61, 0x352787BAA0D7C22F, 0x9853EAB63B5E0B35, 0xABBDCDD7ED5C0860,
+    0xCF05DAF5AC8D77B0, 0x49CAD48CEBF4A71E, 0x7A4C10EC2158C4A6, 0xD9E92AA246BF719E,
+    0x13AE978D09FE5557, 0x730499AF921549FF, 0x4E4B705B92903BA4, 0xFF577222C14F0A3A,
+    0x55B6344CF97AAFAE, 0xB862225B055B6960, 0xCAC09AFBDDD2CDB4, 0xDAF8E9829FE96B5F,
+    0xB5FDFC5D3132C498, 0x310CB380DB6F7503, 0xE87FBB46217A360E, 0x2102AE466EBB1148,
+    0xF8549E1A3AA5E00D, 0x07A69AFDCC42261A, 0xC4C118BFE78FEAAE, 0xF9F4892ED96BD438,
+    0x1AF3DBE25D8F45DA, 0xF5B4B0B0D2DEEEB4, 0x962ACEEFA82E1C84, 0x046E3ECAAF453CE9,
+    0xF05D129681949A4C, 0x964781CE734B3C84, 0x9C2ED44081CE5FBD, 0x522E23F3925E319E,
+    0x177E00F9FC32F791, 0x2BC60A63A6F3B3F2, 0x222BBFAE61725606, 0x486289DDCC3D6780,
+    0x7DC7785B8EFDFC80, 0x8AF38731C02BA980, 0x1FAB64EA29A2DDF7, 0xE4D9429322CD065A,
+    0x9DA058C67844F20C, 0x24C0E332B70019B0, 0x233003B5A6CFE6AD, 0xD586BD01C5C217F6,
+    0x5E5637885F29BC2B, 0x7EBA726D8C94094B, 0x0A56A5F0BFE39272, 0xD79476A84EE20D06,
+    0x9E4C1269BAA4BF37, 0x17EFEE45B0DEE640, 0x1D95B0A5FCF90BC6, 0x93CBE0B699C2585D,
+    0x65FA4F227A2B6D79, 0xD5F9E858292504D5, 0xC2B5A03F71471A6F, 0x59300222B4561E00,
+    0xCE2F8642CA0712DC, 0x7CA9723FBB2E8988, 0x2785338347F2BA08, 0xC61BB3A141E50E8C,
+    0x150F361DAB9DEC26, 0x9F6A419D382595F4, 0x64A53DC924FE7AC9, 0x142DE49FFF7A7C3D,
+    0x0C335248857FA9E7, 0x0A9C32D5EAE45305, 0xE6C42178C4BBB92E, 0x71F1CE2490D20B07,
+    0xF1BCC3D275AFE51A, 0xE728E8C83C334074, 0x96FBF83A12884624, 0x81A1549FD6573DA5,
+    0x5FA7867CAF35E149, 0x56986E2EF3ED091B, 0x917F1DD5F8886C61, 0xD20D8C88C8FFE65F,
+    0x31D71DCE64B2C310, 0xF165B587DF898190, 0xA57E6339DD2CF3A0, 0x1EF6E6DBB1961EC9,
+    0x70CC73D90BC26E24, 0xE21A6B35DF0C3AD7, 0x003A93D8B2806962, 0x1C99DED33CB890A1,
+    0xCF3145DE0ADD4289, 0xD0E4427A5514FB72, 0x77C621CC9FB3A483, 0x67A34DAC4356550B,
+    0xF8D626AAAF278509,
+]
+# [code][square] for pieces (zeros for EMPTY), Polyglot counts the rows from the bottom
+ZOBRIST_PIECES = [[0] * 64 for _ in range(16)]
+for _kind_code in range(PAWN, KING + 1):
+    for _side in (0, BLACK_BIT):
+        _offset = 64 * (2*(_kind_code - 1) + (0 if _side else 1))
+        for _sq in range(64):
+            ZOBRIST_PIECES[_kind_code | _side][_sq] = POLYGLOT_RANDOM[_offset + 8*(7 - _sq//8) + _sq % 8]
+ZOBRIST_WHITE_TO_MOVE = POLYGLOT_RANDOM[780]
+ZOBRIST_CASTLING = [0] * 16
+for _castling in range(16):
+    for _ind in range(4):
+        if _castling & (1 << _ind):
+            ZOBRIST_CASTLING[_castling] ^= POLYGLOT_RANDOM[768 + _ind]
+# Indexed by the file of the en passant square
+ZOBRIST_EP = POLYGLOT_RANDOM[772:780]
 
 ALL_SQRS = []
 for i in range(8):
@@ -122,6 +428,403 @@ for sqr1 in ALL_SQRS:
     for sqr2 in ALL_SQRS:
         ALL_MOVES.append(Move(sqr1 + sqr2))
 
+KNIGHT_DELTAS = [(1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2)]
+KING_DELTAS = [(1, 0), (1, -1), (0, -1), (-1, -1), (-1, 0), (-1, 1), (0, 1), (1, 1)]
+
+# Tables of the bitboard core, a square is the bit x*8 + y (same index as on the compact board)
+SQR_BITS = [1 << sq for sq in range(64)]
+SQR_COORDS = [divmod(sq, 8) for sq in range(64)]
+# Steps as (dx, dy, index step), the first four increase the square index
+RAY_STEPS = [(1, 0, 8), (0, 1, 1), (1, 1, 9), (1, -1, 7), (-1, 0, -8), (0, -1, -1), (-1, -1, -9), (-1, 1, -7)]
+ROOK_RAYS = [0, 1, 4, 5]
+BISHOP_RAYS = [2, 3, 6, 7]
+
+
+def _build_step_attacks(deltas):
+    table = []
+    for x in range(8):
+        for y in range(8):
+            mask = 0
+            for delta_x, delta_y in deltas:
+                if 0 <= x + delta_x < 8 and 0 <= y + delta_y < 8:
+                    mask |= 1 << ((x + delta_x)*8 + y + delta_y)
+            table.append(mask)
+    return table
+
+
+def _build_rays():
+    rays = []
+    for step_x, step_y, _ in RAY_STEPS:
+        table = []
+        for x in range(8):
+            for y in range(8):
+                mask = 0
+                temp_x, temp_y = x + step_x, y + step_y
+                while 0 <= temp_x < 8 and 0 <= temp_y < 8:
+                    mask |= 1 << (temp_x*8 + temp_y)
+                    temp_x += step_x
+                    temp_y += step_y
+                table.append(mask)
+        rays.append(table)
+    return rays
+
+
+KNIGHT_ATTACKS = _build_step_attacks(KNIGHT_DELTAS)
+KING_ATTACKS = _build_step_attacks(KING_DELTAS)
+# Squares attacked by a pawn of the given color standing on a square
+PAWN_ATTACKS = {
+    0: _build_step_attacks([(-1, -1), (-1, 1)]),
+    BLACK_BIT: _build_step_attacks([(1, -1), (1, 1)])
+}
+RAYS = _build_rays()
+ROOK_LINES = [RAYS[0][sq] | RAYS[1][sq] | RAYS[4][sq] | RAYS[5][sq] for sq in range(64)]
+BISHOP_LINES = [RAYS[2][sq] | RAYS[3][sq] | RAYS[6][sq] | RAYS[7][sq] for sq in range(64)]
+QUEEN_LINES = [ROOK_LINES[sq] | BISHOP_LINES[sq] for sq in range(64)]
+
+# Squares strictly between two squares on a common line (0 if they don't share one)
+BETWEEN = [[0] * 64 for _ in range(64)]
+for _sq1 in range(64):
+    for _ray_ind, (_, _, _step) in enumerate(RAY_STEPS):
+        _mask = 0
+        _sq2 = _sq1 + _step
+        while 0 <= _sq2 < 64 and RAYS[_ray_ind][_sq1] & SQR_BITS[_sq2]:
+            BETWEEN[_sq1][_sq2] = _mask
+            _mask |= SQR_BITS[_sq2]
+            _sq2 += _step
+
+
+def _ray_attacks(ray_ind, sq, occupied):
+    """Squares attacked along one ray from sq, up to and including the first occupied square"""
+    attacks = RAYS[ray_ind][sq]
+    blockers = attacks & occupied
+    if blockers:
+        if ray_ind < 4:
+            first = (blockers & -blockers).bit_length() - 1
+        else:
+            first = blockers.bit_length() - 1
+        attacks ^= RAYS[ray_ind][first]
+    return attacks
+
+
+def _iter_bits(mask):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+# Tables of the compact board, so that it never has to check coordinates: the squares along every ray
+# from a square (nearest first, empty rays left out), the targets of knights, kings and pawn captures,
+# and the squares strictly between two squares on a common line
+def _build_ray_squares(ray_inds):
+    table = []
+    for sq in range(64):
+        rays = []
+        for ray_ind in ray_inds:
+            squares = sorted(_iter_bits(RAYS[ray_ind][sq]), reverse=ray_ind >= 4)
+            if squares:
+                rays.append(squares)
+        table.append(rays)
+    return table
+
+
+ROOK_RAY_SQUARES = _build_ray_squares(ROOK_RAYS)
+BISHOP_RAY_SQUARES = _build_ray_squares(BISHOP_RAYS)
+SLIDER_RAY_SQUARES = {
+    BISHOP: BISHOP_RAY_SQUARES,
+    ROOK: ROOK_RAY_SQUARES,
+    QUEEN: [ROOK_RAY_SQUARES[sq] + BISHOP_RAY_SQUARES[sq] for sq in range(64)]
+}
+KNIGHT_TARGETS = [list(_iter_bits(mask)) for mask in KNIGHT_ATTACKS]
+KING_TARGETS = [list(_iter_bits(mask)) for mask in KING_ATTACKS]
+PAWN_TARGETS = {side: [list(_iter_bits(mask)) for mask in PAWN_ATTACKS[side]] for side in (0, BLACK_BIT)}
+BETWEEN_SQUARES = [[tuple(_iter_bits(mask)) for mask in row] for row in BETWEEN]
+
+
+class Bitboards:
+    """
+    Optional bitboard core of a State: an occupancy int for every piece code (twelve are used)
+    and one for each color, kept in sync with the compact board
+    """
+    __slots__ = ("pieces", "colors")
+
+    def __init__(self, board):
+        self.pieces = [0] * 16
+        self.colors = {0: 0, BLACK_BIT: 0}
+        for sq, code in enumerate(board):
+            if code != EMPTY:
+                self.pieces[code] |= SQR_BITS[sq]
+                self.colors[code & BLACK_BIT] |= SQR_BITS[sq]
+
+    def copy(self):
+        res = Bitboards.__new__(Bitboards)
+        res.pieces = self.pieces.copy()
+        res.colors = self.colors.copy()
+        return res
+
+    @property
+    def occupied(self):
+        return self.colors[0] | self.colors[BLACK_BIT]
+
+    def replace(self, sq, old_code, new_code):
+        bit = SQR_BITS[sq]
+        if old_code != EMPTY:
+            self.pieces[old_code] ^= bit
+            self.colors[old_code & BLACK_BIT] ^= bit
+        if new_code != EMPTY:
+            self.pieces[new_code] |= bit
+            self.colors[new_code & BLACK_BIT] |= bit
+
+    def is_attacked(self, sq, side):
+        """
+        Checks if a square is attacked by pieces of one color
+            Parameters:
+                sq (int): Square index
+                side (int): Color code of the attacker (0 or BLACK_BIT)
+        """
+        pieces = self.pieces
+        if KNIGHT_ATTACKS[sq] & pieces[KNIGHT | side]:
+            return True
+        if KING_ATTACKS[sq] & pieces[KING | side]:
+            return True
+        # A pawn attacks sq from the squares a pawn of the other color on sq would attack
+        if PAWN_ATTACKS[side ^ BLACK_BIT][sq] & pieces[PAWN | side]:
+            return True
+        occupied = self.occupied
+        queens = pieces[QUEEN | side]
+        rooks = pieces[ROOK | side] | queens
+        if ROOK_LINES[sq] & rooks:
+            for ray_ind in ROOK_RAYS:
+                if _ray_attacks(ray_ind, sq, occupied) & rooks:
+                    return True
+        bishops = pieces[BISHOP | side] | queens
+        if BISHOP_LINES[sq] & bishops:
+            for ray_ind in BISHOP_RAYS:
+                if _ray_attacks(ray_ind, sq, occupied) & bishops:
+                    return True
+        return False
+
+    def get_pseudo_moves(self, side, ep_sq, castling, captures_only=False):
+        """
+        Returns moves of one color which follow the piece movement rules, see State._get_pseudo_moves
+            Parameters:
+                side (int): Color code of the side to move (0 or BLACK_BIT)
+                ep_sq (int): En passant square index (-1 if none)
+                castling (int): Castling rights of the side to move as CASTLING_BITS flags
+                captures_only (bool): Whether to return only captures and promotions
+        """
+        pieces = self.pieces
+        own = self.colors[side]
+        other = self.colors[side ^ BLACK_BIT]
+        occupied = own | other
+        # Squares the pieces other than pawns may move to
+        targets = other if captures_only else ~own
+        moves = []
+
+        # Pawns
+        step = -8 if side == 0 else 8
+        start_row = 6 if side == 0 else 1
+        promotion_row = 1 if side == 0 else 6
+        pawn_targets = other
+        if ep_sq >= 0:
+            pawn_targets |= SQR_BITS[ep_sq]
+        for sq1 in _iter_bits(pieces[PAWN | side]):
+            x1, y1 = SQR_COORDS[sq1]
+            sq2 = sq1 + step
+            if 0 <= sq2 < 64 and not occupied & SQR_BITS[sq2] and (not captures_only or x1 == promotion_row):
+                moves.append((x1, y1) + SQR_COORDS[sq2])
+                if x1 == start_row and not captures_only and not occupied & SQR_BITS[sq2 + step]:
+                    moves.append((x1, y1) + SQR_COORDS[sq2 + step])
+            for sq2 in _iter_bits(PAWN_ATTACKS[side][sq1] & pawn_targets):
+                moves.append((x1, y1) + SQR_COORDS[sq2])
+
+        # Knights and kings
+        for kind, table in [(KNIGHT, KNIGHT_ATTACKS), (KING, KING_ATTACKS)]:
+            for sq1 in _iter_bits(pieces[kind | side]):
+                coords = SQR_COORDS[sq1]
+                for sq2 in _iter_bits(table[sq1] & targets):
+                    moves.append(coords + SQR_COORDS[sq2])
+
+        # Sliding pieces
+        for kind, ray_inds in [(BISHOP, BISHOP_RAYS), (ROOK, ROOK_RAYS), (QUEEN, ROOK_RAYS + BISHOP_RAYS)]:
+            for sq1 in _iter_bits(pieces[kind | side]):
+                attacks = 0
+                for ray_ind in ray_inds:
+                    attacks |= _ray_attacks(ray_ind, sq1, occupied)
+                coords = SQR_COORDS[sq1]
+                for sq2 in _iter_bits(attacks & targets):
+                    moves.append(coords + SQR_COORDS[sq2])
+
+        if captures_only:
+            return moves
+        # Castling, the attacked squares are checked together with the legality of the move
+        rights = CASTLING_BITS[SIDE_COLORS[side]]
+        for sq1 in _iter_bits(pieces[KING | side]):
+            x1, y1 = SQR_COORDS[sq1]
+            if castling & rights["short"] and y1 + 2 < 8 and not (SQR_BITS[sq1 + 1] | SQR_BITS[sq1 + 2]) & occupied:
+                moves.append((x1, y1, x1, y1 + 2))
+            if (castling & rights["long"] and y1 - 3 >= 0
+                    and not (SQR_BITS[sq1 - 1] | SQR_BITS[sq1 - 2] | SQR_BITS[sq1 - 3]) & occupied):
+                moves.append((x1, y1, x1, y1 - 2))
+        return moves
+
+
+class BoardView:
+    """
+    Adapter which lets the compact board of a State be used like the 8x8 array of Pieces it replaced:
+    board[x, y], board[x][y], iteration over rows and assignment of Pieces all work
+    """
+    __slots__ = ("_state",)
+
+    class Row:
+        __slots__ = ("_state", "_x")
+
+        def __init__(self, state, x):
+            self._state = state
+            self._x = x
+
+        def __getitem__(self, y):
+            return PIECES[self._state._board[self._x*8 + y]]
+
+        def __setitem__(self, y, piece):
+            self._state._set_square(self._x*8 + y, piece.code)
+
+        def __iter__(self):
+            board = self._state._board
+            return iter([PIECES[code] for code in board[self._x*8:self._x*8 + 8]])
+
+        def __len__(self):
+            return 8
+
+    def __init__(self, state):
+        self._state = state
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            x, y = key
+            return PIECES[self._state._board[x*8 + y]]
+        return BoardView.Row(self._state, key)
+
+    def __setitem__(self, key, piece):
+        x, y = key
+        self._state._set_square(x*8 + y, piece.code)
+
+    def __iter__(self):
+        return iter([BoardView.Row(self._state, x) for x in range(8)])
+
+    def __len__(self):
+        return 8
+
+
+class CastleRightsView(MutableMapping):
+    """
+    Adapter for the castling rights of a State in the form {color: {"short": bool, "long": bool}} they replaced.
+    Changes are written through to the state: castle_rights[color]["short"] = False works
+    """
+    __slots__ = ("_state",)
+
+    class Sides(MutableMapping):
+        __slots__ = ("_state", "_bits")
+
+        def __init__(self, state, color):
+            self._state = state
+            self._bits = CASTLING_BITS[color]
+
+        def __getitem__(self, side):
+            return bool(self._state._castling & self._bits[side])
+
+        def __setitem__(self, side, allowed):
+            state = self._state
+            if allowed:
+                state._castling |= self._bits[side]
+            else:
+                state._castling &= ~self._bits[side]
+            state._moves = state._condition = None
+
+        def __delitem__(self, side):
+            raise TypeError("Castling rights can't be removed, set them to False")
+
+        def __iter__(self):
+            return iter(self._bits)
+
+        def __len__(self):
+            return len(self._bits)
+
+        def __repr__(self):
+            return repr(dict(self))
+
+    def __init__(self, state):
+        self._state = state
+
+    def __getitem__(self, color):
+        return CastleRightsView.Sides(self._state, color)
+
+    def __setitem__(self, color, sides):
+        view = self[color]
+        for side in view:
+            view[side] = sides[side]
+
+    def __delitem__(self, color):
+        raise TypeError("Castling rights can't be removed, set them to False")
+
+    def __iter__(self):
+        return iter(CASTLING_BITS)
+
+    def __len__(self):
+        return len(CASTLING_BITS)
+
+    def __repr__(self):
+        return repr({color: dict(sides) for color, sides in self.items()})
+
+
+class EnPassantView(MutableSequence):
+    """
+    Adapter for the en passant squares of a State in the form [(x, y)] they replaced, written through to the state.
+    A State has at most one such square, so adding a second one raises ValueError
+    """
+    __slots__ = ("_state",)
+
+    def __init__(self, state):
+        self._state = state
+
+    def _get_squares(self):
+        ep = self._state._ep
+        return [divmod(ep, 8)] if ep >= 0 else []
+
+    def _set_squares(self, squares):
+        if len(squares) > 1:
+            raise ValueError("A State can only have one en passant square")
+        state = self._state
+        state._ep = squares[0][0]*8 + squares[0][1] if squares else -1
+        state._moves = state._condition = None
+
+    def __getitem__(self, ind):
+        return self._get_squares()[ind]
+
+    def __setitem__(self, ind, coords):
+        squares = self._get_squares()
+        squares[ind] = coords
+        self._set_squares(squares)
+
+    def __delitem__(self, ind):
+        squares = self._get_squares()
+        del squares[ind]
+        self._set_squares(squares)
+
+    def __len__(self):
+        return 1 if self._state._ep >= 0 else 0
+
+    def insert(self, ind, coords):
+        squares = self._get_squares()
+        squares.insert(ind, tuple(coords))
+        self._set_squares(squares)
+
+    def __eq__(self, other):
+        return self._get_squares() == list(other)
+
+    def __repr__(self):
+        return repr(self._get_squares())
+
 
 class State:
     class Condition(Enum):
@@ -129,46 +832,221 @@ class State:
         CHECKMATE = "checkmate"
         STALEMATE = "stalemate"
 
-    def __init__(self, state="initial"):
-        if state == "empty":
-            # Create board of empty here
-            self.board = [[Piece("empty") for _ in range(8)] for _ in range(8)]
-            self.color_to_move = Color.WHITE
-            self.castle_rights = {
-                Color.WHITE: {"short": True, "long": True},
-                Color.BLACK: {"short": True, "long": True}
-            }
-            self.board = np.array(self.board)
+    # The board is kept as 64 piece codes (row by row, from the top-left corner),
+    # castling rights as CASTLING_BITS flags and the en passant square as an index (-1 if none).
+    # With bitboards enabled, a Bitboards copy of the board is kept in sync and used for attack detection
+    # Moves made with push are kept on a stack of undo records, so that pop can take them back.
+    # _key is the Zobrist hash of the pieces only (None until zobrist_key is first read),
+    # the rest of zobrist_key is added when it's read.
+    # The legal moves and the condition are computed when first needed and kept in _moves and _condition
+    # (None if not known yet) until the state is changed.
+    # _material is the sum of IMBALANCE_BY_CODE over the board (None until get_imbalance is first called),
+    # updated with every changed square.
+    # _kings holds the squares of the white and the black king (-1 if not known), and _occupied the masks
+    # of the squares of the white and the black pieces (bit x*8 + y), both also updated by _set_square
+    __slots__ = (
+        "_board", "_color", "_castling", "_ep", "_moves", "_condition", "_bb", "_stack", "_key", "_material",
+        "_kings", "_occupied"
+    )
+
+    def __init__(self, state="initial", bitboards=False):
+        self._board = bytearray(64)
+        self._color = Color.WHITE
+        self._castling = ALL_CASTLING
+        self._ep = -1
+        self._moves = None
+        self._condition = None
 
+        if state == "empty":
+            pass
         elif state == "initial":
             # Create the standard starting position
-            backrank_kinds = [
-                "rook", "knight", "bishop", "queen",
-                "king", "bishop", "knight", "rook"
-            ]
-            self.board = []
-            self.board.append([Piece(kind, "black") for kind in backrank_kinds])
-            self.board.append([Piece("pawn", "black")] * 8)
-            for _ in range(4):
-                self.board.append([Piece("empty")] * 8)
-            self.board.append([Piece("pawn", "white")] * 8)
-            self.board.append([Piece(kind, "white") for kind in backrank_kinds])
-
-            self.board = np.array(self.board)
-
-            self.color_to_move = Color.WHITE
-            self.castle_rights = {
-                Color.WHITE: {"short": True, "long": True},
-                Color.BLACK: {"short": True, "long": True}
-            }
-            self.condition = State.Condition.ONGOING
-            self.en_peas_sqrs = []
+            backrank_kinds = [ROOK, KNIGHT, BISHOP, QUEEN, KING, BISHOP, KNIGHT, ROOK]
+            for y, kind in enumerate(backrank_kinds):
+                self._board[y] = kind | BLACK_BIT
+                self._board[8 + y] = PAWN | BLACK_BIT
+                self._board[48 + y] = PAWN
+                self._board[56 + y] = kind
+        else:
+            raise ValueError(f"Invalid value for 'state': {state}")
+
+        self._bb = Bitboards(self._board) if bitboards else None
+        self._stack = []
+        self._key = None
+        self._material = None
+        self._kings = self._compute_kings()
+        self._occupied = self._compute_occupied()
+
+    @property
+    def board(self):
+        return BoardView(self)
+
+    @board.setter
+    def board(self, board):
+        for x in range(8):
+            for y in range(8):
+                self._set_square(x*8 + y, board[x][y].code)
+
+    @property
+    def color_to_move(self):
+        return self._color
+
+    @color_to_move.setter
+    def color_to_move(self, color):
+        self._color = color
+        self._moves = self._condition = None
+
+    @property
+    def condition(self):
+        """State.Condition of the position, found from the legal moves of the side to move"""
+        if self._condition is None:
+            if len(self._get_moves()) > 0:
+                self._condition = State.Condition.ONGOING
+            elif self.is_check():
+                self._condition = State.Condition.CHECKMATE
+            else:
+                self._condition = State.Condition.STALEMATE
+        return self._condition
+
+    @condition.setter
+    def condition(self, condition):
+        self._condition = condition
+
+    @property
+    def castle_rights(self):
+        """Castling rights in the form {color: {"short": bool, "long": bool}}, changes are written through"""
+        return CastleRightsView(self)
+
+    @castle_rights.setter
+    def castle_rights(self, castle_rights):
+        self._castling = 0
+        for color, sides in CASTLING_BITS.items():
+            for side, bit in sides.items():
+                if castle_rights[color][side]:
+                    self._castling |= bit
+        self._moves = self._condition = None
+
+    @property
+    def en_peas_sqrs(self):
+        """Squares which can be taken en passant, as a list of (x, y) (at most one), changes are written through"""
+        return EnPassantView(self)
+
+    @en_peas_sqrs.setter
+    def en_peas_sqrs(self, en_peas_sqrs):
+        EnPassantView(self)._set_squares([tuple(coords) for coords in en_peas_sqrs])
+
+    def pack(self):
+        """
+        Returns the position in a compact immutable form, suitable for storing many positions
+            Returns:
+                (bytes): 64 piece codes, then a byte with side to move, castling rights and condition
+                    (only if it is already known, as finding it needs the legal moves),
+                    then a byte with the en passant square (0 if none)
+        """
+        flags = self._castling | COLOR_CODES[self.color_to_move] << 1
+        if self._condition is not None:
+            flags |= (CONDITIONS.index(self._condition) + 1) << 5
+        return bytes(self._board) + bytes((flags, self._ep + 1))
+
+    @staticmethod
+    def unpack(data):
+        """Creates a State from the result of State.pack"""
+        state = State("empty")
+        state._board[:] = data[:64]
+        state._key = None
+        state._material = None
+        state._kings = state._compute_kings()
+        state._occupied = state._compute_occupied()
+        flags = data[64]
+        state._castling = flags & ALL_CASTLING
+        state.color_to_move = Color.BLACK if flags & (BLACK_BIT << 1) else Color.WHITE
+        state._ep = data[65] - 1
+        if flags >> 5:
+            state.condition = CONDITIONS[(flags >> 5) - 1]
+        return state
+
+    @staticmethod
+    def from_fen(fen, bitboards=False):
+        """
+        Creates a State from a FEN string. The halfmove clock and the move number are optional and ignored
+            Parameters:
+                fen (str): Position like "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1"
+                bitboards (bool): Whether the state keeps bitboards
+        """
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError(f"Invalid FEN: {fen}")
+        placement, color, castling, en_peas = fields[:4]
+
+        # Translating and replacing whole strings at once is much faster than going through characters
+        placement = placement.encode("latin-1", "replace").translate(FEN_TO_BOARD)
+        for digit, empty_run in FEN_EMPTY_RUNS:
+            placement = placement.replace(digit, empty_run)
+        ranks = placement.split(b"/")
+        if list(map(len, ranks)) != [8] * 8:
+            raise ValueError(f"Invalid piece placement in FEN: {fen}")
+        board = bytearray().join(ranks)
+        if INVALID_CODE in board:
+            raise ValueError(f"Invalid piece placement in FEN: {fen}")
+
+        if color == "w":
+            color = Color.WHITE
+        elif color == "b":
+            color = Color.BLACK
+        else:
+            raise ValueError(f"Invalid side to move in FEN: {fen}")
+
+        castling_bits = 0
+        if castling != "-":
+            for char in castling:
+                if char not in FEN_CASTLING:
+                    raise ValueError(f"Invalid castling rights in FEN: {fen}")
+                castling_bits |= FEN_CASTLING[char]
+
+        if en_peas == "-":
+            ep = -1
+        elif len(en_peas) == 2 and en_peas[0] in "abcdefgh" and en_peas[1] in "36":
+            x, y = State._square_to_coords(en_peas)
+            ep = x*8 + y
+        else:
+            raise ValueError(f"Invalid en passant square in FEN: {fen}")
+
+        state = State.__new__(State)
+        state._board = board
+        state._color = color
+        state._castling = castling_bits
+        state._ep = ep
+        state._moves = None
+        state._condition = None
+        state._bb = Bitboards(board) if bitboards else None
+        state._stack = []
+        state._key = None
+        state._material = None
+        state._kings = state._compute_kings()
+        state._occupied = state._compute_occupied()
+        return state
+
+    def to_fen(self, halfmove_clock=0, move_number=1):
+        """
+        Returns the position as a FEN string
+            Parameters:
+                halfmove_clock (int), move_number (int): The last two FEN fields, which State doesn't keep
+        """
+        board = self._board.translate(BOARD_TO_FEN).decode()
+        placement = "/".join(board[x:x + 8] for x in range(0, 64, 8))
+        for n in range(8, 1, -1):
+            placement = placement.replace("1" * n, str(n))
+
+        color = "w" if self.color_to_move == Color.WHITE else "b"
+        castling = "".join(char for char, bit in FEN_CASTLING.items() if self._castling & bit) or "-"
+        en_peas = State._coords_to_square(divmod(self._ep, 8)) if self._ep >= 0 else "-"
+        return f"{placement} {color} {castling} {en_peas} {halfmove_clock} {move_number}"
 
     def __str__(self):
         res = ""
-        for line in self.board:
-            for piece in line:
-                res += str(piece) + " "
+        for x in range(8):
+            for code in self._board[x*8:x*8 + 8]:
+                res += str(PIECES[code]) + " "
             res += "\n"
         return res
 
@@ -232,211 +1110,246 @@ class State:
         elif color == Color.NONE:
             return Color.NONE
 
-    def _get_path(self, move):
-        """
-        Return squares a piece has to go through for move
-            Parameters:
-                move ([x1, y1, x2, y2]): Move made in matrix coords
-            Returns:
-                [(x0, y0), (x1, y1)] (list of tuples): List of coordinates the piece would have to go through
-        """
+    def _is_free_path(self, move):
+        """Checks that the squares a piece has to go through for move are empty"""
         x1, y1, x2, y2 = move
-        x_step = np.sign(x2 - x1)
-        y_step = np.sign(y2 - y1)
-
-        path = []
-        num_steps = max(abs(x2-x1), abs(y2-y1))
-        temp_x, temp_y = x1, y1
-        for _ in range(num_steps-1):
-            temp_x += x_step
-            temp_y += y_step
-            path.append((temp_x, temp_y))
-        return path
-
-    def _is_valid_path(self, path):
-        for x, y in path:
-            piece = self.board[x, y]
-            if piece.kind != Kind.EMPTY:
+        if self._bb is not None:
+            return not BETWEEN[x1*8 + y1][x2*8 + y2] & self._bb.occupied
+        board = self._board
+        for sq in BETWEEN_SQUARES[x1*8 + y1][x2*8 + y2]:
+            if board[sq] != EMPTY:
                 return False
         return True
 
-    def _execute_move(self, move):
-        x1, y1, x2, y2 = move
-
-        res_state = deepcopy(self)
-        
-
-        # Processing castling
-        delta_x, delta_y = x2 - x1, y2 - y1
-        piece = res_state.board[x1, y1]
-        if piece.kind == Kind.KING:
-            res_state.castle_rights[piece.color]["short"] = False
-            res_state.castle_rights[piece.color]["long"] = False
-            if delta_y == 2:
-                res_state.board[x2, y2-1] = res_state.board[x2, y2+1]
-                res_state.board[x2, y2+1] = Piece("empty")
-            elif delta_y == -2:
-                res_state.board[x2, y2+1] = res_state.board[x2, y2-2]
-                res_state.board[x2, y2-2] = Piece("empty")
-        if piece.kind == Kind.ROOK:
-            if y1 == 0:
-                res_state.castle_rights[piece.color]["long"] = False
-            elif y1 == 7:
-                res_state.castle_rights[piece.color]["short"] = False
-
-        # Processing the general case
-        res_state.board[x2, y2] = res_state.board[x1, y1]
-        res_state.board[x1, y1] = Piece("empty")
-
-        # Processing pawn stuff
-        res_state.en_peas_sqrs = []
-        if piece.kind == Kind.PAWN:
-            if abs(delta_x) == 2:
-                res_state.en_peas_sqrs.append((x2 - delta_x//2, y2))
-            elif (x2, y2) in self.en_peas_sqrs:
-                res_state.board[x1, y2] = Piece("empty")
-            queening = False
-            if piece.color == Color.WHITE and x2 == 0:
-                queening = True
-            elif piece.color == Color.BLACK and x2 == 7:
-                queening = True 
-            if queening:               
-                res_state.board[x2, y2] = Piece("queen", piece.color)
-
-        res_state.color_to_move = self._get_opposite_color(self.color_to_move)
+    def _set_square(self, sq, code):
+        old_code = self._board[sq]
+        if self._bb is not None:
+            self._bb.replace(sq, old_code, code)
+        if self._key is not None:
+            self._key ^= ZOBRIST_PIECES[old_code][sq] ^ ZOBRIST_PIECES[code][sq]
+        if self._material is not None:
+            self._material += IMBALANCE_BY_CODE[code] - IMBALANCE_BY_CODE[old_code]
+        if code & KIND_MASK == KING:
+            self._kings[code >> 3] = sq
+        elif old_code & KIND_MASK == KING and self._kings[old_code >> 3] == sq:
+            self._kings[old_code >> 3] = -1
+        if old_code != EMPTY:
+            self._occupied[old_code >> 3] ^= SQR_BITS[sq]
+        if code != EMPTY:
+            self._occupied[code >> 3] ^= SQR_BITS[sq]
+        self._board[sq] = code
+        self._moves = self._condition = None
+
+    def _compute_piece_key(self):
+        key = 0
+        for sq, code in enumerate(self._board):
+            if code != EMPTY:
+                key ^= ZOBRIST_PIECES[code][sq]
+        return key
+
+    def _compute_material(self):
+        return sum(map(IMBALANCE_BY_CODE.__getitem__, self._board))
+
+    def _compute_kings(self):
+        board = self._board
+        return [board.find(KING), board.find(KING | BLACK_BIT)]
+
+    def _compute_occupied(self):
+        return [int(self._board.translate(digits)[::-1], 2) for digits in OCCUPANCY_DIGITS]
+
+    @property
+    def zobrist_key(self):
+        """
+        64-bit Zobrist hash of the position (the same as the Polyglot one): pieces, side to move,
+        castling rights and the en passant file, which only counts if a pawn can capture en passant
+        """
+        if self._key is None:
+            self._key = self._compute_piece_key()
+        key = self._key ^ ZOBRIST_CASTLING[self._castling]
+        if self._color == Color.WHITE:
+            key ^= ZOBRIST_WHITE_TO_MOVE
+        if self._ep >= 0:
+            # The pawn which has just moved two squares, and the pawns which might capture it
+            if self._color == Color.WHITE:
+                sq, pawn = self._ep + 8, PAWN
+            else:
+                sq, pawn = self._ep - 8, PAWN | BLACK_BIT
+            y = self._ep % 8
+            if (y > 0 and self._board[sq - 1] == pawn) or (y < 7 and self._board[sq + 1] == pawn):
+                key ^= ZOBRIST_EP[y]
+        return key
+
+    def __hash__(self):
+        return self.zobrist_key
+
+    def __eq__(self, other):
+        if not isinstance(other, State):
+            return NotImplemented
+        return (
+            self._board == other._board and self.color_to_move == other.color_to_move
+            and self._castling == other._castling and self._ep == other._ep
+        )
+
+    def copy(self, bitboards=None):
+        """
+        Returns a copy of the state, without the moves pushed on it
+            Parameters:
+                bitboards (bool): Whether the copy keeps bitboards (by default the same as this state)
+        """
+        res_state = State.__new__(State)
+        res_state._board = bytearray(self._board)
+        res_state._color = self._color
+        res_state._castling = self._castling
+        res_state._ep = self._ep
+        res_state._moves = self._moves  # The list is never changed, only replaced
+        res_state._condition = self._condition
+        if bitboards is None:
+            bitboards = self._bb is not None
+        if not bitboards:
+            res_state._bb = None
+        elif self._bb is not None:
+            res_state._bb = self._bb.copy()
+        else:
+            res_state._bb = Bitboards(self._board)
+        res_state._stack = []
+        res_state._key = self._key
+        res_state._material = self._material
+        res_state._kings = self._kings[:]
+        res_state._occupied = self._occupied[:]
         return res_state
 
-    # TODO: Implement this afater refactoring Move 
-    def _do_move_here(self, move):
+    def _make_move(self, move):
+        """
+        Makes a move in place, without checking that it is valid
+            Parameters:
+                move ([x1, y1, x2, y2]): Move made in matrix coords
+            Returns:
+                (tuple): Everything _unmake_move needs to take the move back
+        """
         x1, y1, x2, y2 = move
-
-        self.backwards_changes = {}
+        sq1, sq2 = x1*8 + y1, x2*8 + y2
+        board = self._board
+        code = board[sq1]
+        kind, side = code & KIND_MASK, code & BLACK_BIT
+        changes = [(sq2, board[sq2]), (sq1, code)]
+        record = (move, changes, self._castling, self._ep, self._color, self._moves, self._condition, self._key)
 
         # Processing castling
-        delta_x, delta_y = x2 - x1, y2 - y1
-        piece = self.board[x1, y1]
-        if piece.kind == Kind.KING:
-            if delta_y == 2:
-                self.backwards_changes[(x2, y2-1)] = self.board[x2, y2-1]
-                self.backwards_changes[(x2, y2+1)] = self.board[x2, y2+1]
-                self.board[x2, y2-1] = self.board[x2, y2+1]
-                self.board[x2, y2+1] = Piece("empty")
-            elif delta_y == -2:
-                self.backwards_changes[(x2, y2+1)] = self.board[x2, y2+1]
-                self.backwards_changes[(x2, y2-2)] = self.board[x2, y2-2]
-                self.board[x2, y2+1] = self.board[x2, y2-2]
-                self.board[x2, y2-2] = Piece("empty")
+        self._castling &= CASTLING_MASKS[sq1] & CASTLING_MASKS[sq2]
+        if kind == KING:
+            if y2 - y1 == 2:
+                changes.append((sq2 - 1, board[sq2 - 1]))
+                changes.append((sq2 + 1, board[sq2 + 1]))
+                self._set_square(sq2 - 1, board[sq2 + 1])
+                self._set_square(sq2 + 1, EMPTY)
+            elif y2 - y1 == -2:
+                changes.append((sq2 + 1, board[sq2 + 1]))
+                changes.append((sq2 - 2, board[sq2 - 2]))
+                self._set_square(sq2 + 1, board[sq2 - 2])
+                self._set_square(sq2 - 2, EMPTY)
 
         # Processing the general case
-        self.backwards_changes[(x2, y2)] = self.board[x2, y2]
-        self.backwards_changes[(x1, y1)] = self.board[x1, y1]
-        self.board[x2, y2] = self.board[x1, y1]
-        self.board[x1, y1] = Piece("empty")
+        self._set_square(sq2, code)
+        self._set_square(sq1, EMPTY)
 
         # Processing pawn stuff
-        if piece.kind == Kind.PAWN:
-            if abs(delta_x) == 2:
-                pass
-            elif (x2, y2) in self.en_peas_sqrs:
-                self.backwards_changes[(x1, y2)] = self.board[x1, y2]
-                self.board[x1, y2] = Piece("empty")
-            queening = False
-            if piece.color == Color.WHITE and x2 == 0:
-                queening = True
-            elif piece.color == Color.BLACK and x2 == 7:
-                queening = True 
-            if queening:
-                self.backwards_changes[(x2, y2)] = self.board[x2, y2]
-                self.board[x2, y2] = Piece("queen", piece.color)
-        return
-
-    # TODO: Implement this after refactoring Move
-    def _undo_move_here(self):
-        for coords in self.backwards_changes:
-            x, y = coords
-            self.board[x, y] = self.backwards_changes[coords]
+        ep = -1
+        if kind == PAWN:
+            if abs(x2 - x1) == 2:
+                ep = (x1 + x2)//2*8 + y2
+            elif sq2 == self._ep:
+                changes.append((x1*8 + y2, board[x1*8 + y2]))
+                self._set_square(x1*8 + y2, EMPTY)
+            if (side == 0 and x2 == 0) or (side == BLACK_BIT and x2 == 7):
+                self._set_square(sq2, QUEEN | side)
+        self._ep = ep
+
+        self._color = SIDE_COLORS[side ^ BLACK_BIT]
+        return record
+
+    def _unmake_move(self, record):
+        move, changes, self._castling, self._ep, self._color, moves, condition, key = record
+        for sq, code in changes:
+            self._set_square(sq, code)
+        self._key = key
+        self._moves, self._condition = moves, condition
+        return move
+
+    def push(self, move):
+        """
+        Makes a move on this state in place, so that it can be taken back with pop.
+        The move isn't checked, so it should come from get_possible_moves (or pass is_valid_move)
+            Parameters:
+                move (Move or [x1, y1, x2, y2]): Move to make
+        """
+        if isinstance(move, str):
+            move = Move(move)
+        self._stack.append(self._make_move(move))
 
-    def _find_king(self, color):
-        for i in range(len(self.board)):
-            for j in range(len(self.board[i])):
-                piece = self.board[i, j]
-                if piece.kind == Kind.KING and piece.color == color:
-                    return (i, j)
-        raise Exception("Tried to find king, but no such king on board")
+    def pop(self):
+        """
+        Takes back the last move made with push
+            Returns:
+                move (Move or [x1, y1, x2, y2]): The move which was taken back
+        """
+        return self._unmake_move(self._stack.pop())
 
-    def _is_valid_coords(self, x, y):
-        return (x in range(0, 8)) and (y in range(0, 8))
+    def _execute_move(self, move):
+        res_state = self.copy()
+        res_state._make_move(move)
+        return res_state
 
-    def _is_check_present(self, color):
+    def _find_king(self, color):
+        side = COLOR_CODES[color]
+        sq = self._kings[side >> 3]
+        if sq == -1:
+            # Only after one of two kings of a side was taken off (setting up a position square by square)
+            sq = self._board.find(KING | side)
+            if sq == -1:
+                raise Exception("Tried to find king, but no such king on board")
+            self._kings[side >> 3] = sq
+        return SQR_COORDS[sq]
+
+    def _is_check_present(self, color, king_coords=None):
         # TODO Finish this function
-        king_x, king_y = self._find_king(color)
-        other_color = self._get_opposite_color(color)
-
-        # Process row/column
-        for step_x, step_y in [(1, 0), (0, -1), (-1, 0), (0, 1)]:
-            temp_x, temp_y = king_x+step_x, king_y+step_y
-            while self._is_valid_coords(temp_x, temp_y):
-                piece = self.board[temp_x, temp_y]
-                if piece.kind == Kind.EMPTY:
-                    temp_x += step_x
-                    temp_y += step_y
-                    continue
-                if piece.color == color:
-                    break
-                if piece.kind in [Kind.BISHOP, Kind.PAWN, Kind.KNIGHT, Kind.KING]:
-                    break
-                if piece.kind in [Kind.ROOK, Kind.QUEEN]:
-                    return True
-
-        # Process diagonals
-        for step_x, step_y in [(1, 1), (1, -1), (-1, -1), (-1, 1)]:
-            temp_x, temp_y = king_x+step_x, king_y+step_y
-            while self._is_valid_coords(temp_x, temp_y):
-                piece = self.board[temp_x, temp_y]
-                if piece.kind == Kind.EMPTY:
-                    temp_x += step_x
-                    temp_y += step_y
-                    continue
-                if piece.color == color:
-                    break
-                if piece.kind in [Kind.ROOK, Kind.PAWN, Kind.KNIGHT]:
-                    break
-                if piece.kind in [Kind.BISHOP, Kind.QUEEN]:
-                    return True
-
-        # Process Knights
-        for delta_x, delta_y in [(1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2)]:
-            temp_x, temp_y = king_x+delta_x, king_y+delta_y
-            if not self._is_valid_coords(temp_x, temp_y):
-                continue
-            piece = self.board[temp_x, temp_y]
-            if piece.kind == Kind.KNIGHT and piece.color == other_color:
+        if king_coords is None:
+            king_coords = self._find_king(color)
+        king_x, king_y = king_coords
+        side = COLOR_CODES[color]
+        other_side = side ^ BLACK_BIT
+        if self._bb is not None:
+            return self._bb.is_attacked(king_x*8 + king_y, other_side)
+        board = self._board
+        king_sq = king_x*8 + king_y
+
+        # Process rows/columns and diagonals: the first piece on each ray
+        for rays, slider in ((ROOK_RAY_SQUARES[king_sq], ROOK), (BISHOP_RAY_SQUARES[king_sq], BISHOP)):
+            for ray in rays:
+                for sq in ray:
+                    code = board[sq]
+                    if code != EMPTY:
+                        if code == slider | other_side or code == QUEEN | other_side:
+                            return True
+                        break
+
+        # Process knights, adjacent other-color king and pawns
+        for sq in KNIGHT_TARGETS[king_sq]:
+            if board[sq] == KNIGHT | other_side:
                 return True
-
-        # Process adjacent other-color king
-        for delta_x, delta_y in [(1, 0), (1, -1), (0, -1), (-1, -1), (-1, 0), (-1, 1), (0, 1), (1, 1)]:
-            temp_x, temp_y = king_x+delta_x, king_y+delta_y
-            if not self._is_valid_coords(temp_x, temp_y):
-                continue
-            piece = self.board[temp_x, temp_y]
-            if piece.kind == Kind.KING and piece.color == other_color:
+        for sq in KING_TARGETS[king_sq]:
+            if board[sq] == KING | other_side:
                 return True
-
-        # Process pawns
-        if color == Color.WHITE:
-            pawn_deltas = [(-1, -1), (-1, 1)]
-        elif color == Color.BLACK:
-            pawn_deltas = [(1, -1), (1, 1)]
-        for delta_x, delta_y in pawn_deltas:
-            temp_x, temp_y = king_x+delta_x, king_y+delta_y
-            if not self._is_valid_coords(temp_x, temp_y):
-                continue
-            piece = self.board[temp_x, temp_y]
-            if piece.kind == Kind.PAWN and piece.color == other_color:
+        # The squares a pawn of the other color attacks the king from are the ones an own pawn would attack
+        for sq in PAWN_TARGETS[side][king_sq]:
+            if board[sq] == PAWN | other_side:
                 return True
 
         return False
 
+    def is_check(self):
+        """Checks if the side to move is in check"""
+        return self._is_check_present(self.color_to_move)
+
     def play_move(self, _move):
         # Convert to standard format
         move = Move(_move)
@@ -445,41 +1358,36 @@ class State:
         if not self.is_valid_move(move):
             raise BadMoveError(f"{_move} is not a valid move")
 
-        res_state = self._execute_move(move)
-
-        # Changing condition of res_state
-        check_present = res_state._is_check_present(res_state.color_to_move)
-        poss_moves = res_state.get_possible_moves()
-        if len(poss_moves) == 0:
-            if check_present:
-                res_state.condition = State.Condition.CHECKMATE
-            else:
-                res_state.condition = State.Condition.STALEMATE
-        
-        return res_state
+        # The condition of the new state is found when it's first read
+        return self._execute_move(move)
 
     def is_valid_move(self, move):
         """Accepts move in form [x1, y1, x2, y2]"""
 
         x1, y1, x2, y2 = move
-        piece = self.board[x1, y1]
-        kind = piece.kind
-        color = piece.color
-
-        if color != self.color_to_move:  # Only the correct color can move
+        sq1, sq2 = x1*8 + y1, x2*8 + y2
+        if self._moves is not None:
+            return ALL_MOVES[sq1*64 + sq2] in self._moves
+        board = self._board
+        code = board[sq1]
+        target = board[sq2]
+        kind = code & KIND_MASK
+        color = self.color_to_move
+        side = COLOR_CODES[color]
+
+        if kind == EMPTY or code & BLACK_BIT != side:  # Only the correct color can move
             return False
 
-        if self.board[x2, y2].color == self.color_to_move:  # You can't move onto your own piece
+        if target != EMPTY and target & BLACK_BIT == side:  # You can't move onto your own piece
             return False
 
         # First check if move is possible in general
-        other_color = self._get_opposite_color(color)
         delta_x = x2 - x1
         delta_y = y2 - y1
         if delta_x == 0 and delta_y == 0:
             return False
 
-        if kind == Kind.PAWN:
+        if kind == PAWN:
             if color == Color.WHITE:
                 attack_deltas = [(-1, -1), (-1, 1)]
                 push_delta = [(-1, 0)]
@@ -491,133 +1399,464 @@ class State:
 
             if (delta_x, delta_y) not in (attack_deltas + push_delta + first_push_delta):
                 return False
-            if ((delta_x, delta_y) in push_delta) and (self.board[x2, y2].kind != Kind.EMPTY):
+            if ((delta_x, delta_y) in push_delta) and (target != EMPTY):
                 return False
             if ((delta_x, delta_y) in attack_deltas):
-                if (x2, y2) in self.en_peas_sqrs:
+                if x2*8 + y2 == self._ep:
                     pass
-                elif self.board[x2, y2].color != other_color:
-                    return False           
+                elif target == EMPTY:
+                    return False
             elif (delta_x, delta_y) in first_push_delta:
                 if color == Color.WHITE and x1 != 6:
                     return False
                 elif color == Color.BLACK and x1 != 1:
                     return False
-                if self.board[x2, y2].kind != Kind.EMPTY:
+                if target != EMPTY:
                     return False
-                path = self._get_path(move)
-                if not self._is_valid_path(path):
+                if not self._is_free_path(move):
                     return False
-        elif kind == Kind.KNIGHT:
-            if (abs(delta_x), abs(delta_y)) not in [(1, 2), (2, 1)]:  # Knights can only move in L-shape
+        elif kind == KNIGHT:
+            if not KNIGHT_ATTACKS[sq1] & SQR_BITS[sq2]:  # Knights can only move in L-shape
                 return False
-        elif kind == Kind.BISHOP:
-            if abs(delta_x) != abs(delta_y):  # Bishops only move diagonally
+        elif kind == BISHOP:
+            if not BISHOP_LINES[sq1] & SQR_BITS[sq2]:  # Bishops only move diagonally
                 return False
-            path = self._get_path(move)
-            if not self._is_valid_path(path):
+            if not self._is_free_path(move):
                 return False
-        elif kind == Kind.ROOK:
-            if delta_x != 0 and delta_y != 0:  # Rooks only move vertically/horizontally
+        elif kind == ROOK:
+            if not ROOK_LINES[sq1] & SQR_BITS[sq2]:  # Rooks only move vertically/horizontally
                 return False
-            path = self._get_path(move)
-            if not self._is_valid_path(path):
+            if not self._is_free_path(move):
                 return False
-        elif kind == Kind.QUEEN:
-            if delta_x == 0 or delta_y == 0:  # Queens can move diagonally/vertically/horizontally
-                pass
-            elif abs(delta_x) == abs(delta_y):
-                pass
-            else:
+        elif kind == QUEEN:
+            if not QUEEN_LINES[sq1] & SQR_BITS[sq2]:  # Queens can move diagonally/vertically/horizontally
                 return False
-            path = self._get_path(move)
-            if not self._is_valid_path(path):
+            if not self._is_free_path(move):
                 return False
-        elif kind == Kind.KING:
-            if (abs(delta_x), abs(delta_y)) in [(0, 1), (1, 0), (1, 1)]:
+        elif kind == KING:
+            if KING_ATTACKS[sq1] & SQR_BITS[sq2]:
                 pass
             elif (delta_x, delta_y) == (0, 2):  # Process short-castling
-                if not self.castle_rights[color]["short"]:
+                if not self._castling & CASTLING_BITS[color]["short"]:
                     return False
                 if self._is_check_present(color):
                     return False
                 for i in [1, 2]:
-                    temp_x, temp_y = x1, y1
-                    temp_y += i
-                    temp_piece = self.board[temp_x, temp_y]
-                    if temp_piece.kind != Kind.EMPTY:
+                    if board[x1*8 + y1 + i] != EMPTY:
                         return False
-                    temp_state = deepcopy(self)
-                    temp_state.board[temp_x, temp_y] = temp_state.board[temp_x, temp_y - i]
-                    temp_state.board[temp_x, temp_y - i] = Piece("empty")
-                    if temp_state._is_check_present(color):
+                    # The king can't pass through an attacked square (the same test as with the king moved there)
+                    if self._is_check_present(color, (x1, y1 + i)):
                         return False
             elif (delta_x, delta_y) == (0, -2):  # Process long-castling
-                if not self.castle_rights[color]["long"]:
+                if not self._castling & CASTLING_BITS[color]["long"]:
                     return False
                 if self._is_check_present(color):
                     return False
-                if self.board[x1, y1 - 3].kind != Kind.EMPTY:
-                    return False                
+                if board[x1*8 + y1 - 3] != EMPTY:
+                    return False
                 for i in [-1, -2]:
-                    temp_x, temp_y = x1, y1
-                    temp_y += i
-                    temp_piece = self.board[temp_x, temp_y]
-                    if temp_piece.kind != Kind.EMPTY:
+                    if board[x1*8 + y1 + i] != EMPTY:
                         return False
-                    temp_state = deepcopy(self)
-                    temp_state.board[temp_x, temp_y] = temp_state.board[temp_x, temp_y - i]
-                    temp_state.board[temp_x, temp_y - i] = Piece("empty")
-                    if temp_state._is_check_present(color):
+                    # The king can't pass through an attacked square (the same test as with the king moved there)
+                    if self._is_check_present(color, (x1, y1 + i)):
                         return False
             else:
                 return False
             # TODO: add possibility for castling
 
         # Check if the move creates/leaves a check on the player who moved
-        self._do_move_here(move)
-        if self._is_check_present(self.color_to_move):
-            self._undo_move_here()
+        self.push(move)
+        check_present = self._is_check_present(color)
+        self.pop()
+        if check_present:
             return False
-        self._undo_move_here()
 
         return True
 
+    def _get_pseudo_moves(self, captures_only=False):
+        """
+        Returns moves of the side to move which follow the piece movement rules,
+        but may still leave the own king in check
+            Parameters:
+                captures_only (bool): Whether to return only captures and promotions
+            Returns:
+                [(x1, y1, x2, y2)] (list of tuples): Candidate moves in matrix coords
+        """
+        side = COLOR_CODES[self.color_to_move]
+        board = self._board
+        moves = []
+        for sq1 in _iter_bits(self._occupied[side >> 3]):
+            kind = board[sq1] & KIND_MASK
+            x1, y1 = sq1 >> 3, sq1 & 7
+
+            if kind == PAWN:
+                if side == 0:
+                    step, start_x = -1, 6
+                else:
+                    step, start_x = 1, 1
+                x2 = x1 + step
+                if not 0 <= x2 < 8:
+                    continue
+                if board[x2*8 + y1] == EMPTY and (not captures_only or x2 == 0 or x2 == 7):
+                    moves.append((x1, y1, x2, y1))
+                    if x1 == start_x and not captures_only and board[(x2 + step)*8 + y1] == EMPTY:
+                        moves.append((x1, y1, x2 + step, y1))
+                for y2 in (y1 - 1, y1 + 1):
+                    if not 0 <= y2 < 8:
+                        continue
+                    target = board[x2*8 + y2]
+                    if (target != EMPTY and target & BLACK_BIT != side) or x2*8 + y2 == self._ep:
+                        moves.append((x1, y1, x2, y2))
+
+            elif kind == KNIGHT or kind == KING:
+                for sq2 in (KNIGHT_TARGETS if kind == KNIGHT else KING_TARGETS)[sq1]:
+                    target = board[sq2]
+                    if target == EMPTY:
+                        if not captures_only:
+                            moves.append((x1, y1) + SQR_COORDS[sq2])
+                    elif target & BLACK_BIT != side:
+                        moves.append((x1, y1) + SQR_COORDS[sq2])
+                if kind == KING and not captures_only:
+                    color = self.color_to_move
+                    if (self._castling & CASTLING_BITS[color]["short"] and y1 + 2 < 8
+                            and board[sq1 + 1] == EMPTY and board[sq1 + 2] == EMPTY):
+                        moves.append((x1, y1, x1, y1 + 2))
+                    if (self._castling & CASTLING_BITS[color]["long"] and y1 - 3 >= 0
+                            and board[sq1 - 1] == EMPTY and board[sq1 - 2] == EMPTY and board[sq1 - 3] == EMPTY):
+                        moves.append((x1, y1, x1, y1 - 2))
+
+            else:
+                for ray in SLIDER_RAY_SQUARES[kind][sq1]:
+                    for sq2 in ray:
+                        target = board[sq2]
+                        if target == EMPTY:
+                            if not captures_only:
+                                moves.append((x1, y1) + SQR_COORDS[sq2])
+                        else:
+                            if target & BLACK_BIT != side:
+                                moves.append((x1, y1) + SQR_COORDS[sq2])
+                            break
+        return moves
+
+    def _is_legal_pseudo_move(self, move, king_coords, in_check):
+        """
+        Checks that a move produced by _get_pseudo_moves doesn't leave own king in check
+            Parameters:
+                move ((x1, y1, x2, y2)): Candidate move in matrix coords
+                king_coords ((x, y)): Coordinates of the king of the side to move
+                in_check (bool): Whether the king of the side to move is in check now
+        """
+        x1, y1, x2, y2 = move
+        king_x, king_y = king_coords
+        if not in_check and (x1, y1) != king_coords and x2*8 + y2 != self._ep:
+            # A piece which doesn't share a line with its king can't be pinned
+            if not QUEEN_LINES[king_x*8 + king_y] & SQR_BITS[x1*8 + y1]:
+                return True
+        if (x1, y1) == king_coords:
+            if abs(y2 - y1) == 2:
+                # Castling: the king can't be in check, pass through or land on an attacked square
+                step = (y2 - y1) // 2
+                for y in (y1, y1 + step, y2):
+                    if self._is_check_present(self.color_to_move, (x1, y)):
+                        return False
+                return True
+            king_coords = (x2, y2)
+        color = self.color_to_move
+        self.push(move)
+        check_present = self._is_check_present(color, king_coords)
+        self.pop()
+        return not check_present
+
     def get_possible_moves(self):
-        poss_moves = []
-        for move in ALL_MOVES:
-            if self.is_valid_move(move):
-                poss_moves.append(move)
-        return poss_moves
+        """
+        Returns all legal moves of the side to move
+            Returns:
+                [Move] (list): Legal moves, ordered the same way as ALL_MOVES (a new list on every call)
+        """
+        return list(self._get_moves())
 
-    def get_imbalance(self):
-        color_mult = {
-            Color.WHITE: 1,
-            Color.BLACK: -1,
-            Color.NONE: 0
-        }
-        piece_values = {
-            Kind.QUEEN: 9, 
-            Kind.ROOK: 5, 
-            Kind.BISHOP: 3,
-            Kind.KNIGHT: 3,
-            Kind.PAWN: 1,
-            Kind.KING: 0,
-            Kind.EMPTY: 0
-        }
-        res = 0
-        for i in range(8):
-            for j in range(8):
-                piece = self.board[i, j]
-                res += color_mult[piece.color] * piece_values[piece.kind]
+    def _get_moves(self):
+        """Returns the legal moves kept in _moves (they must not be changed), generating them if needed"""
+        if self._moves is None:
+            self._moves = self._generate_moves()
+        return self._moves
+
+    def get_captures(self):
+        """
+        Returns the legal captures (en passant included) and promotions of the side to move
+            Returns:
+                [Move] (list): Moves, ordered the same way as ALL_MOVES
+        """
+        if self._moves is not None:
+            board = self._board
+            captures = []
+            for move in self._moves:
+                x1, y1, x2, y2 = move.coords
+                # Pawn moves to another file are captures, pawn moves to the last row promotions
+                if board[x2*8 + y2] != EMPTY or (
+                        board[x1*8 + y1] & KIND_MASK == PAWN and (y1 != y2 or x2 == 0 or x2 == 7)):
+                    captures.append(move)
+            return captures
+        return self._generate_moves(captures_only=True)
+
+    def _generate_moves(self, captures_only=False):
+        timings = getattr(search_timings, "times", None)
+        if timings is not None:
+            start = time.perf_counter()
+        if self._bb is not None:
+            pseudo_moves = self._bb.get_pseudo_moves(
+                COLOR_CODES[self.color_to_move], self._ep, self._castling, captures_only
+            )
+        else:
+            pseudo_moves = self._get_pseudo_moves(captures_only)
+        if timings is not None:
+            generated = time.perf_counter()
+            timings["movegen"] += generated - start
+        king_coords = self._find_king(self.color_to_move)
+        in_check = self._is_check_present(self.color_to_move, king_coords)
+        move_inds = []
+        for move in pseudo_moves:
+            if self._is_legal_pseudo_move(move, king_coords, in_check):
+                x1, y1, x2, y2 = move
+                move_inds.append((x1*8 + y1)*64 + x2*8 + y2)
+        move_inds.sort()
+        if timings is not None:
+            timings["legality"] += time.perf_counter() - generated
+        return [ALL_MOVES[ind] for ind in move_inds]
+
+    def perft(self, depth):
+        """
+        Counts the positions at the given depth of the tree of legal moves (for testing the move generator)
+            Parameters:
+                depth (int): Number of plies
+            Returns:
+                (int): Number of leaf positions
+        """
+        if depth == 0:
+            return 1
+        moves = self._get_moves()
+        if depth == 1:
+            return len(moves)
+        nodes = 0
+        for move in moves:
+            self.push(move)
+            nodes += self.perft(depth - 1)
+            self.pop()
+        return nodes
+
+    def divide(self, depth):
+        """
+        Splits perft(depth) by the first move, to find where two move generators disagree
+            Returns:
+                {"e2-e4": nodes} (dict): Number of leaf positions after each legal move
+        """
+        res = {}
+        for move in self.get_possible_moves():
+            self.push(move)
+            res[str(move)] = self.perft(depth - 1)
+            self.pop()
         return res
 
+    def move_to_uci(self, move):
+        """Returns a move in the long algebraic notation of UCI, like "e2e4" or "e7e8q" """
+        x1, y1, x2, y2 = move
+        uci = State._coords_to_square((x1, y1)) + State._coords_to_square((x2, y2))
+        if self._board[x1*8 + y1] & KIND_MASK == PAWN and x2 in (0, 7):
+            uci += "q"
+        return uci
+
+    def parse_uci(self, uci):
+        """
+        Finds a legal move of the side to move written in the long algebraic notation of UCI
+            Parameters:
+                uci (str): Move like "e2e4", "e1g1" (castling) or "e7e8q"
+            Returns:
+                (Move): The move
+        """
+        if not UCI_RE.match(uci):
+            raise ValueError(f"Invalid UCI move: {uci}")
+        if len(uci) == 5 and uci[4] != "q":
+            raise BadMoveError(f"{uci}: promotion to a piece other than a queen is not supported")
+        x1, y1 = State._square_to_coords(uci[:2])
+        x2, y2 = State._square_to_coords(uci[2:4])
+        move = ALL_MOVES[(x1*8 + y1)*64 + x2*8 + y2]
+        if move not in self._get_moves():
+            raise BadMoveError(f"{uci} is not a valid move")
+        return move
+
+    def move_to_san(self, move):
+        """
+        Returns a legal move of the side to move in standard algebraic notation
+            Parameters:
+                move (Move or [x1, y1, x2, y2]): The move
+            Returns:
+                (str): Move like "Nbxd7+", "e8=Q#" or "O-O"
+        """
+        x1, y1, x2, y2 = move
+        sq1, sq2 = x1*8 + y1, x2*8 + y2
+        code = self._board[sq1]
+        kind = code & KIND_MASK
+        if kind == KING and abs(y2 - y1) == 2:
+            res = "O-O" if y2 > y1 else "O-O-O"
+        elif kind == PAWN:
+            res = State._coords_to_square((x2, y2))
+            if y1 != y2:
+                res = "abcdefgh"[y1] + "x" + res
+            if x2 == 0 or x2 == 7:
+                res += "=Q"
+        else:
+            # Other pieces of the same kind which can move to the same square
+            others = []
+            for other in self._get_moves():
+                ox1, oy1, ox2, oy2 = other
+                if ox2*8 + oy2 == sq2 and ox1*8 + oy1 != sq1 and self._board[ox1*8 + oy1] == code:
+                    others.append((ox1, oy1))
+            res = FEN_CHARS[kind]
+            if others:
+                if all(oy1 != y1 for _, oy1 in others):
+                    res += "abcdefgh"[y1]
+                elif all(ox1 != x1 for ox1, _ in others):
+                    res += str(8 - x1)
+                else:
+                    res += State._coords_to_square((x1, y1))
+            if self._board[sq2] != EMPTY:
+                res += "x"
+            res += State._coords_to_square((x2, y2))
+
+        self.push(move)
+        if self.is_check():
+            res += "#" if len(self._get_moves()) == 0 else "+"
+        self.pop()
+        return res
+
+    def parse_san(self, san, validate=True):
+        """
+        Finds the move of the side to move written in standard algebraic notation
+            Parameters:
+                san (str): Move like "Nbxd7+", "e8=Q#" or "O-O"
+                validate (bool): Whether to check the move against the legal moves.
+                    Without it the notation is trusted: it's only checked that a piece can reach the target,
+                    and legality is checked only to tell apart pieces which can both do it
+            Returns:
+                (Move): The move
+        """
+        san = san.rstrip("+#!?")
+        color = self.color_to_move
+        side = COLOR_CODES[color]
+        if san in ("O-O", "0-0", "O-O-O", "0-0-0"):
+            x1, y1 = self._find_king(color)
+            y2 = y1 + 2 if len(san) == 3 else y1 - 2
+            move = ALL_MOVES[(x1*8 + y1)*64 + x1*8 + y2]
+            if validate and move not in self._get_moves():
+                raise BadMoveError(f"{san} is not a valid move")
+            return move
+
+        match = SAN_RE.match(san)
+        if match is None:
+            raise ValueError(f"Invalid SAN move: {san}")
+        letter, from_file, from_rank, capture, target, promotion = match.groups()
+        if promotion is not None and promotion != "Q":
+            raise BadMoveError(f"{san}: promotion to a piece other than a queen is not supported")
+        x2, y2 = State._square_to_coords(target)
+        sq2 = x2*8 + y2
+        code = (SAN_KINDS[letter] if letter else PAWN) | side
+        from_y = ord(from_file) - ord("a") if from_file else None
+        from_x = 8 - int(from_rank) if from_rank else None
+
+        if validate:
+            candidates = []
+            for move in self._get_moves():
+                x1, y1, mx2, my2 = move
+                if (mx2*8 + my2 == sq2 and self._board[x1*8 + y1] == code
+                        and from_y in (None, y1) and from_x in (None, x1)):
+                    candidates.append(move)
+        else:
+            candidates = [
+                ALL_MOVES[(x1*8 + y1)*64 + sq2] for x1, y1 in self._find_san_sources(code, x2, y2)
+                if from_y in (None, y1) and from_x in (None, x1)
+            ]
+            if len(candidates) > 1:
+                # Only one of them can be legal, the others are pinned
+                king_coords = self._find_king(color)
+                in_check = self._is_check_present(color, king_coords)
+                candidates = [
+                    move for move in candidates if self._is_legal_pseudo_move(tuple(move), king_coords, in_check)
+                ]
+        if len(candidates) != 1:
+            problem = "not a valid" if len(candidates) == 0 else "an ambiguous"
+            raise BadMoveError(f"{san} is {problem} move")
+        return candidates[0]
+
+    def _find_san_sources(self, code, x2, y2):
+        """Returns squares of the pieces with the given code which could move to (x2, y2), ignoring pins"""
+        board = self._board
+        kind = code & KIND_MASK
+        if kind == PAWN:
+            back = 1 if code & BLACK_BIT == 0 else -1
+            if board[x2*8 + y2] == EMPTY and x2*8 + y2 != self._ep:
+                if 0 <= x2 + back < 8 and board[(x2 + back)*8 + y2] == code:
+                    return [(x2 + back, y2)]
+                if 0 <= x2 + 2*back < 8 and board[(x2 + 2*back)*8 + y2] == code:
+                    return [(x2 + 2*back, y2)]
+                return []
+            return [
+                (x2 + back, y1) for y1 in (y2 - 1, y2 + 1)
+                if 0 <= y1 < 8 and 0 <= x2 + back < 8 and board[(x2 + back)*8 + y1] == code
+            ]
+
+        sources = []
+        sq1 = board.find(code)
+        while sq1 != -1:
+            x1, y1 = sq1 >> 3, sq1 & 7
+            delta_x, delta_y = abs(x2 - x1), abs(y2 - y1)
+            if kind == KNIGHT:
+                reachable = (delta_x, delta_y) in ((1, 2), (2, 1))
+            elif kind == KING:
+                reachable = max(delta_x, delta_y) == 1
+            else:
+                straight = delta_x == 0 or delta_y == 0
+                diagonal = delta_x == delta_y
+                if kind == ROOK:
+                    reachable = straight
+                elif kind == BISHOP:
+                    reachable = diagonal
+                else:
+                    reachable = straight or diagonal
+                reachable = reachable and (x1, y1) != (x2, y2) and self._is_free_path((x1, y1, x2, y2))
+            if reachable:
+                sources.append((x1, y1))
+            sq1 = board.find(code, sq1 + 1)
+        return sources
+
+    def get_codes(self):
+        """Returns the piece codes of the 64 squares (row by row, from a8 to h1) as bytes"""
+        return bytes(self._board)
+
+    def get_imbalance(self):
+        """Returns the material balance (positive if white is ahead)"""
+        if self._material is None:
+            self._material = self._compute_material()
+        return self._material
+
+
+# If a thread sets search_timings.times to a dict with "movegen" and "legality" keys, the seconds its States spend
+# generating moves and checking their legality are added to it (see chessbots.SearchStats). It is per thread,
+# so that searches running at the same time on different threads are measured separately
+search_timings = threading.local()
+
+# Conditions in the order of their numbers in State.pack
+CONDITIONS = list(State.Condition)
+
 
 class Game:
-    def __init__(self):
+    def __init__(self, state=None):
+        """
+            Parameters:
+                state (State): Position to start from (by default the initial one)
+        """
         self.move_counter = 0
         self.history = []
-        self.states = [State("initial")]
+        self.states = [state if state is not None else State("initial")]
         return
 
     def __str__(self):
@@ -626,17 +1865,21 @@ class Game:
         res += f"To-move:\t{self.states[-1].color_to_move}\n"
         return res
 
-    def play_move(self, _move):
+    def play_move(self, _move, validate=True):
         """
         Tries to make a move
             Parameters:
                 move (str): a move in the form "a2-a4"
+                validate (bool): Whether to check the move, without it the move has to be legal
             Returns:
                 (bool): whether it was possible to make the move
         """
         try:
             move = Move(_move)
-            new_state = self.states[-1].play_move(move)
+            if validate:
+                new_state = self.states[-1].play_move(move)
+            else:
+                new_state = self.states[-1]._execute_move(move)
         except BadMoveError:
             print(f"Unable to make move '{move}'")
             return False
@@ -655,7 +1898,7 @@ class Game:
                 (bool): whether it was possible make this sequence of moves
         """
         for m in seq.split(";"):
-            if not self.make_move(m):
+            if not self.play_move(m):
                 return False
         return True
 
@@ -668,11 +1911,20 @@ class Game:
     def get_history(self):
         return self.history
 
+    def get_san_history(self):
+        """Returns the moves played in standard algebraic notation"""
+        return [state.move_to_san(Move(move)) for state, move in zip(self.states, self.history)]
+
     def get_condition(self):
         return self.states[-1].condition
 
 
 class GraphicGame(Game):
+    # Posted (from the thread of the player) when a requested move is ready
+    MOVE_READY_EVENT = pygame.USEREVENT
+    FPS = 30
+    SQUARE_SIZE = 100
+
     def __init__(self, player1, player2):
         super().__init__()
         pygame.init()
@@ -685,87 +1937,94 @@ class GraphicGame(Game):
         self.SCREEN_HEIGHT = 800
 
         self.screen = pygame.display.set_mode((self.SCREEN_WIDTH, self.SCREEN_HEIGHT))
-        self.board_im = pygame.image.load("resources/board.png")
-        self.shade_im = pygame.image.load("resources/shade.png")
+        self.board_im = pygame.image.load("resources/board.png").convert()
+        self.shade_im = pygame.image.load("resources/shade.png").convert_alpha()
+        # Every piece image is loaded once, indexed by piece code
+        self.piece_ims = [None] * 16
+        for code, piece in enumerate(PIECES):
+            if piece is not None and piece.kind != Kind.EMPTY:
+                self.piece_ims[code] = pygame.image.load(
+                    f"resources/{piece.color.value}_{piece.kind.value}.png"
+                ).convert_alpha()
+        self.clock = pygame.time.Clock()
+
+    def _request_move(self, player, state):
+        future = player.request_move(state)
+        future.add_done_callback(lambda _: pygame.event.post(pygame.event.Event(self.MOVE_READY_EVENT)))
+        self.move_requested = True
+
+    def _draw_square(self, i, j, code, shaded, marked):
+        """
+        Draws one square of the board
+            Returns:
+                (pygame.Rect): The area of the screen which was drawn
+        """
+        rect = pygame.Rect(j*self.SQUARE_SIZE, i*self.SQUARE_SIZE, self.SQUARE_SIZE, self.SQUARE_SIZE)
+        self.screen.blit(self.board_im, rect, area=rect)
+        if marked:
+            pygame.draw.rect(self.screen, (255, 0, 0), rect)
+        if shaded:
+            self.screen.blit(self.shade_im, rect)
+        if code != EMPTY:
+            self.screen.blit(self.piece_ims[code], rect)
+        return rect
 
     def main(self):
         import chessbots
         running = True
-        checkmate = False
-        human_move_ready = False
-        cm_x_pos = cm_y_pos = 0
+        checkmate_sq = None
+        # What every square showed in the last frame: (piece code, shaded, marked), None to redraw it
+        drawn = [None] * 64
         while running:
             # Getting variables
             state = self.get_state()
-            board = self.get_board()
-
-            # Drawing the background
-            self.screen.blit(self.board_im, (0, 0))
-
-            if checkmate:
-                pygame.draw.rect(
-                    self.screen, (255, 0, 0),
-                    pygame.Rect(cm_x_pos, cm_y_pos, 100, 100)
-                )
-
-            # Drawing the shade
-            mouse_x, mouse_y = pygame.mouse.get_pos()
-            x = mouse_x // 100 * 100
-            y = mouse_y // 100 * 100
-            self.screen.blit(self.shade_im, (x, y))
-
-            # Drawing the board
-            for i in range(8):
-                for j in range(8):
-                    kind_str = board[i][j].kind.value
-                    color_str = board[i][j].color.value
-                    if kind_str == "empty":
-                        continue
-                    piece_im = pygame.image.load(f"resources/{color_str}_{kind_str}.png")
-                    self.screen.blit(piece_im, (100*j, 100*i))
 
             player = self.players[self.player_to_move]
             cond = self.get_condition()
-            if cond == State.Condition.ONGOING:
-                if isinstance(player, chessbots.Human):
-                    if human_move_ready:
-                        self.play_move(move)
-                        self.player_to_move = (self.player_to_move + 1) % 2
-                        self.move_requested = False
-                        human_move_ready = False
-                else:
-                    move_ready = player.is_move_ready()
-                    if not self.move_requested:
-                        player.request_move(state)
-                        self.move_requested = True
-                    elif move_ready:
-                        move = player.get_move()
-                        self.play_move(move)
-                        self.player_to_move = (self.player_to_move + 1) % 2
-                        self.move_requested = False
+            if cond == State.Condition.ONGOING and not self.move_requested:
+                self._request_move(player, state)
 
             # Processing events
             for event in pygame.event.get():
-                if cond == State.Condition.ONGOING: 
-                    if isinstance(player, chessbots.Human):
+                if cond == State.Condition.ONGOING:
+                    if event.type == self.MOVE_READY_EVENT:
+                        if player.is_move_ready():
+                            self.play_move(player.get_move())
+                            self.player_to_move = (self.player_to_move + 1) % 2
+                            self.move_requested = False
+                    elif isinstance(player, chessbots.Human):
                         if event.type == MOUSEBUTTONDOWN:
                             x_pos, y_pos = pygame.mouse.get_pos()
                             from_coords = [y_pos//100, x_pos//100]
                         elif event.type == MOUSEBUTTONUP:
                             x_pos, y_pos = pygame.mouse.get_pos()
                             to_coords = [y_pos//100, x_pos//100]
-                            move = from_coords + to_coords
-                            if state.is_valid_move(move):
-                                human_move_ready = True                            
+                            player.submit_move(from_coords + to_coords)
                 elif cond == State.Condition.CHECKMATE:
-                    color = state.color_to_move
-                    checkmate = True
-                    i, j = state._find_king(color)
-                    cm_x_pos, cm_y_pos = j * 100, i * 100
+                    i, j = state._find_king(state.color_to_move)
+                    checkmate_sq = i*8 + j
 
                 if event.type == KEYDOWN:
                     if event.key == K_ESCAPE:
                         running = False
                 elif event.type == QUIT:
                     running = False
-            pygame.display.update()
\ No newline at end of file
+                elif event.type == VIDEOEXPOSE:  # The window has to be drawn again
+                    drawn = [None] * 64
+
+            # Drawing only the squares which look different than in the last frame
+            mouse_x, mouse_y = pygame.mouse.get_pos()
+            shade_sq = mouse_y // self.SQUARE_SIZE * 8 + mouse_x // self.SQUARE_SIZE
+            board = self.get_state()._board
+            dirty = []
+            for sq in range(64):
+                look = (board[sq], sq == shade_sq, sq == checkmate_sq)
+                if drawn[sq] != look:
+                    dirty.append(self._draw_square(sq >> 3, sq & 7, *look))
+                    drawn[sq] = look
+            if dirty:
+                pygame.display.update(dirty)
+            self.clock.tick(self.FPS)
+
+        for player in self.players:
+            player.cancel()
\ No newline at end of file
@@ -1,79 +1,383 @@
+import asyncio
 import chess
+import concurrent.futures
+import multiprocessing
 import numpy as np
+import os
 import time
 import threading
 from random import shuffle
-import pygame
-from pygame.locals import (
-    KEYDOWN,
-    K_ESCAPE,
-    QUIT,
-    MOUSEBUTTONUP,
-    MOUSEBUTTONDOWN
-)
+
+
+# Worker threads shared by all bots, so that asking for a move doesn't start a new thread
+_move_executor = concurrent.futures.ThreadPoolExecutor(thread_name_prefix="player")
 
 
 class Player:
+    """
+    A player is asked for a move with request_move, which returns a concurrent.futures.Future of the move,
+    or with the coroutine choose_move. Bots only implement find_move, which is run on a shared worker thread
+    and should return early (with the best move found so far) once stop_event is set.
+    If book (a book.OpeningBook) or tablebase (a tablebase.Tablebase) is set, positions in the book
+    or in the endgame tables are answered from them without searching
+    """
     def __init__(self):
-        self.move_ready = False
-        self.move = None
+        self.future = None
+        self.book = None
+        self.tablebase = None
+        self._search = None  # Future of the last find_move submitted to the worker threads
+        self._stop_request = threading.Event()  # stop_event of the latest request
+        self._worker_request = threading.local()
+
+    @property
+    def stop_event(self):
+        """
+        Event telling find_move to return early. Every request gets its own, so that a cancelled search
+        can't be resumed by the next request: on a worker thread it is the one of the request being worked on,
+        elsewhere the one of the latest request
+        """
+        return getattr(self._worker_request, "stop_event", self._stop_request)
+
+    def _new_request(self):
+        """Stops the search of the previous request if it is still running, and returns the event of the new one"""
+        self._stop_request.set()
+        self._stop_request = threading.Event()
+        return self._stop_request
+
+    def find_move(self, state: chess.State):
+        """
+        Computes a move, called on a worker thread
+            Returns:
+                (chess.Move or [x1, y1, x2, y2]): The move to play
+        """
+        raise NotImplementedError
+
+    def request_move(self, state: chess.State):
+        """
+        Starts thinking about a move
+            Returns:
+                (concurrent.futures.Future): Future of the move
+        """
+        stop_event = self._new_request()
+        known_move = self.book.find_move(state) if self.book is not None else None
+        if known_move is None and self.tablebase is not None:
+            known_move = self.tablebase.find_move(state)
+        if known_move is not None:
+            self.future = concurrent.futures.Future()
+            self.future.set_result(known_move)
+        else:
+            self.future = self._search = _move_executor.submit(self._find_move_after, self._search, stop_event, state)
+        return self.future
+
+    def _find_move_after(self, previous, stop_event, state):
+        """
+        Runs find_move for a request once the search of the previous one has ended,
+        as both would use the bot's tables and statistics
+        """
+        if previous is not None:
+            concurrent.futures.wait([previous])
+        self._worker_request.stop_event = stop_event
+        try:
+            return self.find_move(state)
+        finally:
+            del self._worker_request.stop_event
+
+    async def choose_move(self, state: chess.State, timeout=None):
+        """
+        Returns a move, thinking in the background so that other games and players can use the event loop.
+        If the time runs out (asyncio.TimeoutError) or the waiting task is cancelled, the player is cancelled
+            Parameters:
+                timeout (float): Seconds to wait for the move, None to wait as long as needed
+        """
+        future = asyncio.wrap_future(self.request_move(state))
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except BaseException:
+            self.cancel()
+            raise
+
+    def cancel(self):
+        """Tells the player that the requested move isn't needed anymore"""
+        self._stop_request.set()
+        if self.future is not None:
+            self.future.cancel()
+            self.future = None
 
     def is_move_ready(self):
-        return self.move_ready
+        return self.future is not None and self.future.done() and not self.future.cancelled()
 
     def get_move(self):
-        self.move_ready = False
-        move = self.move
-        self.move = None
+        """Returns the requested move, waiting for it if it isn't ready yet"""
+        move = self.future.result()
+        self.future = None
         return move
 
-    def request_move(self, state: chess.State):
-        return
-
 
 class Human(Player):
+    """The moves are given with submit_move (GraphicGame passes on the moves made with the mouse)"""
     def __init__(self):
         super().__init__()
+        self.state = None
         return
 
-    def _find_move(self, state: chess.State):
-        while True:
-            for event in pygame.event.get():
-                if event.type == MOUSEBUTTONDOWN:
-                    x_pos, y_pos = pygame.mouse.get_pos()
-                    from_coords = [y_pos//100, x_pos//100]
-                elif event.type == MOUSEBUTTONUP:
-                    x_pos, y_pos = pygame.mouse.get_pos()
-                    to_coords = [y_pos//100, x_pos//100]
-
-                    move = from_coords + to_coords
-                    if state.is_valid_move(move):
-                        self.move = move
-                        self.move_ready = True
-                        return
-
     def request_move(self, state: chess.State):
-        thr = threading.Thread(target=self._find_move, args=(state,))
-        thr.start()
-        return
+        self._new_request()
+        self.state = state
+        self.future = concurrent.futures.Future()
+        return self.future
+
+    def submit_move(self, move):
+        """
+        Makes the requested move
+            Returns:
+                (bool): Whether the move was accepted, it has to be valid and requested
+        """
+        if self.future is None or self.future.done() or not self.state.is_valid_move(move):
+            return False
+        self.future.set_result(move)
+        return True
 
 
 class RandomBot(Player):
     def __init__(self):
         super().__init__()
 
-    def _find_move(self, state: chess.State):
-        time.sleep(2)
+    def find_move(self, state: chess.State):
+        self.stop_event.wait(2)
         poss_moves = state.get_possible_moves()
         ind = np.random.randint(0, len(poss_moves))
-        self.move = poss_moves[ind]
-        self.move_ready = True
-        return
+        return poss_moves[ind]
 
-    def request_move(self, state: chess.State):
-        thr = threading.Thread(target=self._find_move, args=(state,))
-        thr.start()
-        return
+
+class SearchStats:
+    """
+    Counters of the last search of a bot. The split of the time between move generation, legality checking
+    and evaluation is only measured by bots created with timing=True, as measuring it slows the search down
+    """
+    def __init__(self):
+        self.depth = 0
+        self.nodes = 0  # Positions visited, including the quiescence search
+        self.qnodes = 0  # Positions visited by the quiescence search, the leaves where it starts included
+        self.expanded = 0  # Positions of the main search whose moves were searched
+        self.moves = 0  # Moves searched from them
+        self.cutoffs = 0  # Expanded positions where a move was good enough to stop searching (beta cutoffs)
+        self.first_move_cutoffs = 0  # Cutoffs by the first move searched
+        # Cutoffs by the kind of the move which made them, see MoveOrderer
+        self.cutoff_kinds = {"hash": 0, "capture": 0, "killer": 0, "quiet": 0}
+        self.evaluations = 0
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.seconds = 0.0
+        self.times = {"movegen": 0.0, "legality": 0.0, "evaluation": 0.0}
+
+    @property
+    def nps(self):
+        return self.nodes / self.seconds if self.seconds > 0 else 0.0
+
+    @property
+    def branching_factor(self):
+        """Average number of moves searched from an expanded position"""
+        return self.moves / self.expanded if self.expanded else 0.0
+
+    @property
+    def cutoff_rate(self):
+        return self.cutoffs / self.expanded if self.expanded else 0.0
+
+    @property
+    def first_move_cutoff_rate(self):
+        """Share of the cutoffs made by the first move, a measure of move ordering"""
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    @property
+    def tt_hit_rate(self):
+        return self.tt_hits / self.tt_probes if self.tt_probes else 0.0
+
+    def as_dict(self):
+        res = {
+            name: getattr(self, name) for name in [
+                "depth", "nodes", "qnodes", "expanded", "moves", "cutoffs", "first_move_cutoffs", "evaluations",
+                "tt_probes", "tt_hits", "seconds", "nps", "branching_factor", "cutoff_rate",
+                "first_move_cutoff_rate", "tt_hit_rate"
+            ]
+        }
+        res["cutoff_kinds"] = dict(self.cutoff_kinds)
+        res["times"] = dict(self.times)
+        return res
+
+
+def format_info(info):
+    """
+    Returns a progress report of a search as a UCI "info" line
+        Parameters:
+            info (dict): Report passed to the info callback of AlphaBetaBot
+    """
+    score = info["score"]
+    if abs(score) >= AlphaBetaBot.MATE_SCORE - 100:
+        # Plies to mate are turned into moves, negative if the side to move gets mated
+        plies = AlphaBetaBot.MATE_SCORE - abs(score)
+        score_text = f"mate {(plies + 1)//2 if score > 0 else -(plies//2)}"
+    else:
+        score_text = f"cp {score * 100}"
+    return (f"info depth {info['depth']} score {score_text} nodes {info['nodes']} nps {info['nps']:.0f} "
+            f"time {info['seconds'] * 1000:.0f} pv {' '.join(info['pv'])}")
+
+
+_MINMAX_INF = 1_000_000
+_MINMAX_MATE = 1000
+_shared_best = None  # Best root score found so far, shared by the workers of MinMaxBot
+_minmax_nodes = 0  # Positions visited by _min_max and _quiescence in this process
+_orderer = None  # MoveOrderer of the worker, created by _init_root_worker
+_search_id = None  # Search the worker has last worked on
+
+
+def _init_root_worker(shared_best):
+    global _shared_best, _orderer
+    _shared_best = shared_best
+    _orderer = MoveOrderer()  # Shared by the root moves the worker searches
+
+
+# Piece values by kind, for move ordering
+_KIND_VALUES = [chess.PIECE_VALUES.get(kind, 0) for kind in range(8)]
+_PROMOTION_GAIN = _KIND_VALUES[chess.QUEEN] - _KIND_VALUES[chess.PAWN]
+
+
+def _mvv_lva(board, move):
+    """
+    Sort key of a move: captures of the most valuable victims by the least valuable attackers first
+    (en passant included), promotions count as capturing what the pawn gains; 0 for other moves
+        Parameters:
+            board (bytearray): The piece codes of the position (State._board)
+    """
+    x1, y1, x2, y2 = move
+    attacker = board[x1*8 + y1] & chess.KIND_MASK
+    victim = board[x2*8 + y2] & chess.KIND_MASK
+    score = 0
+    if attacker == chess.PAWN:
+        if victim == chess.EMPTY and y1 != y2:
+            victim = chess.PAWN  # En passant
+        if x2 == 0 or x2 == 7:
+            score = 10*_PROMOTION_GAIN
+    if victim != chess.EMPTY:
+        score += 10*_KIND_VALUES[victim] - _KIND_VALUES[attacker] + 10
+    return score
+
+
+def _evaluate(state: chess.State):
+    """
+    Returns the static evaluation from the point of view of the side to move. The time it takes is added
+    to the "evaluation" time of the search running on this thread, if it is measured (see chess.search_timings)
+    """
+    times = getattr(chess.search_timings, "times", None)
+    if times is not None:
+        start = time.perf_counter()
+    score = state.get_imbalance()
+    if state.color_to_move == chess.Color.BLACK:
+        score = -score
+    if times is not None:
+        times["evaluation"] += time.perf_counter() - start
+    return score
+
+
+def _quiescence(state: chess.State, alpha, beta):
+    """
+    Searches only captures and promotions until the position is quiet, so that a leaf of the main search
+    isn't evaluated in the middle of an exchange. The side to move may also "stand pat", keeping the
+    static evaluation instead of capturing, unless it is in check
+        Returns:
+            (int): Value from the point of view of the side to move
+    """
+    global _minmax_nodes
+    _minmax_nodes += 1
+    if state.is_check():
+        moves = state.get_possible_moves()
+        if len(moves) == 0:
+            return -_MINMAX_MATE
+        best = -_MINMAX_INF
+    else:
+        best = _evaluate(state)
+        if best >= beta:
+            return best
+        moves = state.get_captures()
+    board = state._board
+    moves.sort(key=lambda move: _mvv_lva(board, move), reverse=True)
+    for move in moves:
+        state.push(move)
+        score = -_quiescence(state, -beta, -max(alpha, best))
+        state.pop()
+        if score > best:
+            best = score
+            if best >= beta:
+                break
+    return best
+
+
+def _min_max(state: chess.State, depth, alpha, beta, quiescence=False, ply=0):
+    """Minimax value with alpha-beta pruning, from the point of view of the side to move"""
+    global _minmax_nodes
+    if depth == 0 and quiescence:
+        return _quiescence(state, alpha, beta)
+    _minmax_nodes += 1
+    if depth == 0:
+        return _evaluate(state)
+    moves = state.get_possible_moves()
+    if len(moves) == 0:
+        return -_MINMAX_MATE - depth if state.is_check() else 0  # Prefer the quickest mates
+    best = -_MINMAX_INF
+    for move in _orderer.order(state, moves, ply):
+        state.push(move)
+        score = -_min_max(state, depth - 1, -beta, -max(alpha, best), quiescence, ply + 1)
+        state.pop()
+        if score > best:
+            best = score
+            if best >= beta:
+                _orderer.record_cutoff(state, move, depth, ply)
+                break
+    return best
+
+
+def _search_root_move(packed_state, move_ind, depth, quiescence=False, bitboards=False, search_id=None):
+    """
+    Worker of MinMaxBot: searches one root move
+        Parameters:
+            packed_state (bytes): Root position from State.pack
+            move_ind (int): Index of the move in State.get_possible_moves of the root
+            quiescence (bool): Whether to run a quiescence search at the leaves
+            bitboards (bool): Whether to search on the bitboard core of State
+            search_id (int): Number of the search the move belongs to, the worker is reused by the next ones
+        Returns:
+            (int): Score of the move for the side to move at the root. It is exact if it is at least
+                the best score of the other moves, otherwise it is only an upper bound
+            (int): Number of positions visited
+    """
+    global _minmax_nodes, _search_id
+    _minmax_nodes = 1
+    if search_id != _search_id:
+        _orderer.new_search()
+        _search_id = search_id
+    state = chess.State.unpack(packed_state).copy(bitboards=bitboards)
+    state.push(state.get_possible_moves()[move_ind])
+    moves = state.get_possible_moves()
+    if depth <= 1 or len(moves) == 0:
+        score = -_min_max(state, 0 if depth <= 1 else depth - 1, -_MINMAX_INF, _MINMAX_INF, quiescence)
+    else:
+        best = -_MINMAX_INF
+        for move in _orderer.order(state, moves, 1):
+            # Only refuting replies need an exact score. The bound is one below the best root score,
+            # so that moves as good as the best one still get an exact score and ties are decided by order
+            beta = -(_shared_best.value - 1)
+            if best >= beta:
+                break
+            state.push(move)
+            score = -_min_max(state, depth - 2, -beta, -best, quiescence, 2)
+            state.pop()
+            if score >= beta:
+                _orderer.record_cutoff(state, move, depth - 1, 1)
+            best = max(best, score)
+        score = -best
+    with _shared_best.get_lock():
+        if score > _shared_best.value:
+            _shared_best.value = score
+    return score, _minmax_nodes
 
 
 class MinMaxBot(Player):
@@ -89,21 +393,40 @@ class MinMaxBot(Player):
             for move in self.poss_moves:
                 self.childs.append(MinMaxBot.Node(self.state.play_move(move)))
 
-        def build_tree(self, max_depth, depth=0):
+        def build_tree(self, max_depth, depth=0, quiescence=False, stats=None, alpha=-_MINMAX_INF, beta=_MINMAX_INF):
+            """
+            Builds the whole tree down to max_depth. The evaluations of the siblings searched so far give the window
+            (alpha, beta) (from white's point of view) of the quiescence search at the leaves: outside of it
+            a leaf only needs a bound, as it can't change the choice above it, and that bound is found quickly
+            """
+            if stats is not None:
+                stats.nodes += 1
             if depth >= max_depth:
+                if stats is not None:
+                    stats.evaluations += 1
+                if quiescence:
+                    if self.state.color_to_move == chess.Color.WHITE:
+                        self.eval = _quiescence(self.state, alpha, beta)
+                    else:
+                        self.eval = -_quiescence(self.state, -beta, -alpha)
+                else:
+                    score = _evaluate(self.state)
+                    self.eval = score if self.state.color_to_move == chess.Color.WHITE else -score
                 del self.state
                 return
 
             self._create_childs()
+            if stats is not None:
+                stats.expanded += 1
+                stats.moves += len(self.childs)
             color_to_move = self.state.color_to_move
             del self.state
             for child in self.childs:
-                child.build_tree(max_depth, depth+1)
-            # with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-            #     futures = [
-            #         executor.submit(child.build_tree, max_depth, depth+1) for child in self.childs
-            #     ]
-            # concurrent.futures.wait(futures)
+                child.build_tree(max_depth, depth+1, quiescence, stats, alpha, beta)
+                if color_to_move == chess.Color.WHITE:
+                    alpha = max(alpha, child.eval)
+                else:
+                    beta = min(beta, child.eval)
 
             childs_evals = [child.eval for child in self.childs]
             if color_to_move == chess.Color.WHITE:
@@ -117,18 +440,507 @@ class MinMaxBot(Player):
         def get_best_move(self):
             return self.poss_moves[self.best_ind]
 
-    def __init__(self, max_depth):
+    def __init__(self, max_depth, processes=1, quiescence=True, timing=False, bitboards=False):
+        """
+            Parameters:
+                max_depth (int): Depth of the search tree
+                processes (int): Number of worker processes the root moves are split across,
+                    None for one per CPU; with 1 the whole tree is built in this process
+                quiescence (bool): Whether to follow the captures at the leaves of the tree
+                    before evaluating them (see _quiescence)
+                timing (bool): Whether to measure the time spent in move generation and legality checking,
+                    only done when the tree is built in this process
+                bitboards (bool): Whether to search on the bitboard core of State (the compact board is faster)
+        """
         super().__init__()
         self.max_depth = max_depth
+        self.processes = processes if processes is not None else os.cpu_count()
+        self.quiescence = quiescence
+        self.timing = timing
+        self.bitboards = bitboards
+        self.stats = SearchStats()  # Of the last search
+        # Worker processes, started by the first parallel search and kept for the next ones (see close)
+        self._executor = None
+        self._shared_best = None
+        self._searches = 0
 
-    def _find_move(self, state: chess.State):
-        root = MinMaxBot.Node(state)
-        root.build_tree(self.max_depth)
-        self.move = root.get_best_move()
-        self.move_ready = True
-        return
+    def close(self):
+        """Stops the worker processes"""
+        if getattr(self, "_executor", None) is not None:
+            self._executor.shutdown()
+            self._executor = None
 
-    def request_move(self, state: chess.State):
-        thr = threading.Thread(target=self._find_move, args=(state,))
-        thr.start()
-        return
+    def __del__(self):
+        self.close()
+
+    def _find_move_parallel(self, state: chess.State):
+        """
+        Searches every root move in a worker process with alpha-beta pruning,
+        the workers share the best score found so far as the alpha bound.
+        The result doesn't depend on the order the workers finish in: of the moves with the best score
+        the first one in State.get_possible_moves order is chosen
+        """
+        moves = state.get_possible_moves()
+        if len(moves) == 0:
+            return None
+        packed = state.pack()
+        if self._executor is None:
+            # Starting the processes takes much longer than a short search, so they are reused
+            self._shared_best = multiprocessing.Value("i", -_MINMAX_INF)
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.processes, initializer=_init_root_worker, initargs=(self._shared_best,)
+            )
+        self._shared_best.value = -_MINMAX_INF
+        self._searches += 1
+        futures = [
+            self._executor.submit(_search_root_move, packed, ind, self.max_depth, self.quiescence, self.bitboards,
+                                  self._searches)
+            for ind in range(len(moves))
+        ]
+        results = [future.result() for future in futures]
+        scores = [score for score, _ in results]
+        self.stats.nodes = 1 + sum(nodes for _, nodes in results)
+        best_ind = max(range(len(moves)), key=lambda ind: (scores[ind], -ind))
+        return moves[best_ind]
+
+    def find_move(self, state: chess.State):
+        global _minmax_nodes
+        self.stats = SearchStats()
+        self.stats.depth = self.max_depth
+        start = time.perf_counter()
+        if self.processes > 1:
+            move = self._find_move_parallel(state)
+        else:
+            _minmax_nodes = 0
+            if self.timing:
+                chess.search_timings.times = self.stats.times
+            try:
+                root = MinMaxBot.Node(state.copy(bitboards=self.bitboards))
+                root.build_tree(self.max_depth, quiescence=self.quiescence, stats=self.stats)
+            finally:
+                chess.search_timings.times = None
+            if self.quiescence:
+                # The quiescence search starts at the leaves, which are already counted
+                self.stats.qnodes = _minmax_nodes
+                self.stats.nodes += _minmax_nodes - self.stats.evaluations
+            move = root.get_best_move()
+        self.stats.seconds = time.perf_counter() - start
+        return move
+
+
+class MoveOrderer:
+    """
+    Orders the moves of a position so that alpha-beta search tries the likely best ones first and cuts off
+    sooner: the move from the transposition table (hash move), then captures by MVV-LVA, then the killer
+    moves of the ply (quiet moves which made a cutoff in a sibling position), then the other quiet moves
+    by the history heuristic (how often and how deep they made cutoffs anywhere in the search).
+    The killers and the history are kept between the iterations of iterative deepening
+    """
+    KILLERS = 2  # Killer moves kept per ply
+    # Ranges of the sort keys, history scores stay far below KILLER_KEY
+    HASH_KEY = 1 << 42
+    CAPTURE_KEY = 1 << 41
+    KILLER_KEY = 1 << 40
+
+    def __init__(self, killers=True, history=True):
+        """
+            Parameters:
+                killers (bool): Whether to use killer moves
+                history (bool): Whether to order the quiet moves by the history heuristic
+        """
+        self.use_killers = killers
+        self.use_history = history
+        self.killers = []  # Ply -> killer moves, the most recent first
+        self.history = {}  # Move -> sum of depth*depth over the cutoffs it made
+
+    def new_search(self):
+        """Forgets the killers, which belong to the previous position, and halves the history"""
+        self.killers = []
+        self.history = {move: score // 2 for move, score in self.history.items() if score > 1}
+
+    def clear(self):
+        self.killers = []
+        self.history = {}
+
+    def _get_killers(self, ply):
+        return self.killers[ply] if ply is not None and ply < len(self.killers) else ()
+
+    def order(self, state: chess.State, moves, ply=None, hash_move=None):
+        """
+        Returns the moves sorted from the most to the least promising
+            Parameters:
+                ply (int): Distance from the root, for the killer moves (None for none)
+                hash_move (chess.Move): Best move stored for the position in the transposition table
+        """
+        board = state._board
+        killers = self._get_killers(ply)
+        history = self.history
+
+        def key(move):
+            if move is hash_move:
+                return self.HASH_KEY
+            capture = _mvv_lva(board, move)
+            if capture > 0:
+                return self.CAPTURE_KEY + capture
+            if move in killers:
+                return self.KILLER_KEY - killers.index(move)
+            return history.get(move, 0)
+
+        return sorted(moves, key=key, reverse=True)
+
+    def get_kind(self, state: chess.State, move, ply=None, hash_move=None):
+        """Returns which rule of the ordering the move falls under: "hash", "capture", "killer" or "quiet" """
+        if move is hash_move:
+            return "hash"
+        if _mvv_lva(state._board, move) > 0:
+            return "capture"
+        if move in self._get_killers(ply):
+            return "killer"
+        return "quiet"
+
+    def record_cutoff(self, state: chess.State, move, depth, ply):
+        """
+        Remembers a move which made a beta cutoff, captures are left out as MVV-LVA already puts them first
+            Parameters:
+                depth (int): Remaining depth of the search at the position, deeper cutoffs count more
+        """
+        if _mvv_lva(state._board, move) > 0:
+            return
+        if self.use_killers:
+            while len(self.killers) <= ply:
+                self.killers.append([])
+            killers = self.killers[ply]
+            if move not in killers:
+                killers.insert(0, move)
+                del killers[self.KILLERS:]
+        if self.use_history:
+            self.history[move] = self.history.get(move, 0) + depth*depth
+
+
+class TranspositionTable:
+    """
+    Fixed-size table of search results keyed by State.zobrist_key, meant to be kept for a whole game.
+    Every key maps to one slot; a slot is replaced if it is empty, holds the same position,
+    was written during an older search, or was searched less deep than the new result
+    """
+    EXACT = 0
+    LOWER = 1  # The score is at least the stored one (the search failed high)
+    UPPER = 2  # The score is at most the stored one (the search failed low)
+
+    def __init__(self, size=2**18):
+        """
+            Parameters:
+                size (int): Number of slots, rounded down to a power of two
+        """
+        self.size = 1 << (size.bit_length() - 1)
+        self.mask = self.size - 1
+        self.entries = [None] * self.size
+        self.age = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.replacements = 0
+
+    def new_search(self):
+        """Marks the entries written so far as old, so that they are replaced first"""
+        self.age += 1
+
+    def clear(self):
+        self.entries = [None] * self.size
+        self.hits = self.misses = self.stores = self.replacements = 0
+
+    def peek(self, key):
+        """Like probe, but without counting it as a hit or a miss"""
+        entry = self.entries[key & self.mask]
+        if entry is None or entry[0] != key:
+            return None
+        return entry[1:5]
+
+    def probe(self, key):
+        """
+        Looks up a position
+            Returns:
+                (depth, score, bound, move) (tuple): The stored result, or None if the position isn't stored
+        """
+        entry = self.entries[key & self.mask]
+        if entry is None or entry[0] != key:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[1:5]
+
+    def store(self, key, depth, score, bound, move):
+        ind = key & self.mask
+        entry = self.entries[ind]
+        if entry is not None:
+            if entry[0] != key and entry[5] == self.age and entry[1] > depth:
+                return
+            if entry[0] != key:
+                self.replacements += 1
+        self.entries[ind] = (key, depth, score, bound, move, self.age)
+        self.stores += 1
+
+    @property
+    def hit_rate(self):
+        probes = self.hits + self.misses
+        return self.hits / probes if probes else 0.0
+
+    def get_stats(self):
+        return {
+            "size": self.size,
+            "used": self.size - self.entries.count(None),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+            "stores": self.stores,
+            "replacements": self.replacements
+        }
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class AlphaBetaBot(Player):
+    """
+    Negamax search with alpha-beta pruning and iterative deepening: the search goes one ply deeper
+    at a time until time_limit (in seconds) runs out, max_depth is reached or max_nodes are visited,
+    and plays the best move of the deepest search
+    """
+    MATE_SCORE = 1000
+
+    def __init__(self, time_limit=2.0, max_depth=None, tt=None, quiescence=True, timing=False, info=None,
+                 max_nodes=None, killers=True, history=True, bitboards=False):
+        """
+            Parameters:
+                time_limit (float): Seconds to search for, None for no time limit
+                max_depth (int): Maximal depth of the search, None for no depth limit
+                tt (TranspositionTable): Table to use, several bots may share one (by default a new one)
+                quiescence (bool): Whether to follow the captures at the leaves of the search
+                    before evaluating them
+                timing (bool): Whether to measure the time spent in move generation, legality checking
+                    and evaluation (see SearchStats)
+                info (callable): Called with a progress report after every completed depth: a dict with
+                    "depth", "score", "nodes", "nps", "seconds" and "pv" (the expected moves in UCI notation).
+                    format_info turns it into a UCI "info" line
+                max_nodes (int): Number of positions after which the search stops, None for no limit
+                killers (bool), history (bool): Whether to order quiet moves by the killer moves
+                    and the history heuristic (see MoveOrderer)
+                bitboards (bool): Whether to search on the bitboard core of State (the compact board is faster)
+        """
+        super().__init__()
+        if time_limit is None and max_depth is None and max_nodes is None:
+            raise ValueError("One of 'time_limit', 'max_depth' and 'max_nodes' has to be set")
+        self.time_limit = time_limit
+        self.max_depth = max_depth
+        self.max_nodes = max_nodes
+        self.tt = tt if tt is not None else TranspositionTable()
+        self.orderer = MoveOrderer(killers, history)
+        self.quiescence = quiescence
+        self.timing = timing
+        self.info = info
+        self.bitboards = bitboards
+
+        # Results of the last search
+        self.depth = 0
+        self.score = 0
+        self.stats = SearchStats()
+
+    @property
+    def nodes(self):
+        return self.stats.nodes
+
+    def _evaluate(self, state: chess.State):
+        """Returns the evaluation from the point of view of the side to move"""
+        self.stats.evaluations += 1
+        return _evaluate(state)
+
+    def _check_limits(self):
+        """Stops the search (raising SearchTimeout) if it is out of time or nodes, or was told to stop"""
+        if ((self.deadline is not None and time.perf_counter() > self.deadline) or self.stop_event.is_set()
+                or (self.max_nodes is not None and self.stats.nodes > self.max_nodes)):
+            raise SearchTimeout()
+
+    def _quiescence(self, state: chess.State, alpha, beta, ply):
+        """Searches only captures and promotions, with stand pat, see _quiescence of the module"""
+        self.stats.nodes += 1
+        self.stats.qnodes += 1
+        self._check_limits()
+        if state.is_check():
+            moves = state.get_possible_moves()
+            if len(moves) == 0:
+                return -self.MATE_SCORE + ply
+            best = -self.MATE_SCORE - 1
+        else:
+            best = self._evaluate(state)
+            if best >= beta:
+                return best
+            moves = state.get_captures()
+        for move in self.orderer.order(state, moves):
+            state.push(move)
+            score = -self._quiescence(state, -beta, -max(alpha, best), ply + 1)
+            state.pop()
+            if score > best:
+                best = score
+                if best >= beta:
+                    break
+        return best
+
+    def _alpha_beta(self, state: chess.State, depth, alpha, beta, ply):
+        if depth == 0 and self.quiescence:
+            return self._quiescence(state, alpha, beta, ply)
+        stats = self.stats
+        stats.nodes += 1
+        self._check_limits()
+        if depth == 0:
+            return self._evaluate(state)
+
+        key = state.zobrist_key
+        hash_move = None
+        entry = self.tt.probe(key)
+        stats.tt_probes += 1
+        if entry is not None:
+            stats.tt_hits += 1
+            tt_depth, tt_score, bound, hash_move = entry
+            if tt_depth >= depth:
+                tt_score = self._score_from_tt(tt_score, ply)
+                if bound == TranspositionTable.EXACT:
+                    return tt_score
+                if bound == TranspositionTable.LOWER and tt_score >= beta:
+                    return tt_score
+                if bound == TranspositionTable.UPPER and tt_score <= alpha:
+                    return tt_score
+
+        moves = state.get_possible_moves()
+        if len(moves) == 0:
+            if state.is_check():
+                return -self.MATE_SCORE + ply  # Prefer the quickest mates
+            return 0
+
+        alpha_orig = alpha
+        best_move = None
+        stats.expanded += 1
+        for ind, move in enumerate(self.orderer.order(state, moves, ply, hash_move)):
+            stats.moves += 1
+            state.push(move)
+            score = -self._alpha_beta(state, depth - 1, -beta, -alpha, ply + 1)
+            state.pop()
+            if score >= beta:
+                stats.cutoffs += 1
+                if ind == 0:
+                    stats.first_move_cutoffs += 1
+                stats.cutoff_kinds[self.orderer.get_kind(state, move, ply, hash_move)] += 1
+                self.orderer.record_cutoff(state, move, depth, ply)
+                self.tt.store(key, depth, self._score_to_tt(score, ply), TranspositionTable.LOWER, move)
+                return score
+            if score > alpha:
+                alpha = score
+                best_move = move
+        bound = TranspositionTable.EXACT if alpha > alpha_orig else TranspositionTable.UPPER
+        self.tt.store(key, depth, self._score_to_tt(alpha, ply), bound, best_move)
+        return alpha
+
+    def _score_to_tt(self, score, ply):
+        """Mate scores are stored as distance from the stored position, not from the root"""
+        if score > self.MATE_SCORE - 100:
+            return score + ply
+        if score < -self.MATE_SCORE + 100:
+            return score - ply
+        return score
+
+    def _score_from_tt(self, score, ply):
+        if score > self.MATE_SCORE - 100:
+            return score - ply
+        if score < -self.MATE_SCORE + 100:
+            return score + ply
+        return score
+
+    def _search_root(self, state: chess.State, moves, depth):
+        best_move, best_score = None, -self.MATE_SCORE - 1
+        self.stats.expanded += 1
+        try:
+            for move in moves:
+                self.stats.moves += 1
+                state.push(move)
+                score = -self._alpha_beta(state, depth - 1, -self.MATE_SCORE - 1, -best_score, 1)
+                state.pop()
+                if score > best_score:
+                    best_move, best_score = move, score
+        except SearchTimeout:
+            # The state is left in the middle of a branch, the caller doesn't use it anymore
+            raise SearchTimeout((best_move, best_score))
+        return best_move, best_score
+
+    def _get_pv(self, state: chess.State, move, depth):
+        """Returns the expected moves in UCI notation: the given move, then the best moves stored in the table"""
+        state = state.copy()
+        pv = []
+        while move is not None and len(pv) < depth and state.is_valid_move(move):
+            pv.append(state.move_to_uci(move))
+            state.push(move)
+            entry = self.tt.peek(state.zobrist_key)
+            move = entry[3] if entry is not None else None
+        return pv
+
+    def search(self, state: chess.State):
+        """
+        Finds the best move for the side to move
+            Parameters:
+                state (chess.State): Position to search, it is not modified
+            Returns:
+                (chess.Move): The best move found
+        """
+        start = time.perf_counter()
+        self.deadline = start + self.time_limit if self.time_limit is not None else None
+        self.depth = 0
+        self.stats = SearchStats()
+        self.tt.new_search()
+        self.orderer.new_search()
+        if self.timing:
+            chess.search_timings.times = self.stats.times
+        try:
+            return self._iterative_deepening(state, start)
+        finally:
+            chess.search_timings.times = None
+            self.stats.depth = self.depth
+            self.stats.seconds = time.perf_counter() - start
+
+    def _iterative_deepening(self, state: chess.State, start):
+        root = state.copy(bitboards=self.bitboards)
+        moves = self.orderer.order(root, root.get_possible_moves())
+        if len(moves) == 0:
+            return None
+        best_move, self.score = moves[0], 0
+
+        depth = 1
+        while self.max_depth is None or depth <= self.max_depth:
+            try:
+                move, score = self._search_root(root, moves, depth)
+            except SearchTimeout as timeout:
+                # The best move so far goes first, so a partial result is at least as good
+                move, score = timeout.args[0]
+                if move is not None:
+                    best_move, self.score = move, score
+                break
+            best_move, self.score, self.depth = move, score, depth
+            if self.info is not None:
+                seconds = time.perf_counter() - start
+                self.info({
+                    "depth": depth,
+                    "score": score,
+                    "nodes": self.stats.nodes,
+                    "nps": self.stats.nodes / seconds if seconds > 0 else 0.0,
+                    "seconds": seconds,
+                    "pv": self._get_pv(root, move, depth)
+                })
+            # Search the best move first on the next iteration
+            moves.remove(move)
+            moves.insert(0, move)
+            if abs(score) >= self.MATE_SCORE - depth:
+                break  # A forced mate was found, deeper searches can't change it
+            depth += 1
+        return best_move
+
+    def find_move(self, state: chess.State):
+        return self.search(state)
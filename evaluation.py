@@ -0,0 +1,108 @@
+import numpy as np
+
+import chess
+
+
+# Piece-square tables in centipawns for white, row by row from the 8th rank like State boards
+# (from the "Simplified Evaluation Function" of the Chess Programming Wiki)
+PIECE_SQUARE_TABLES = {
+    chess.PAWN: [
+        0, 0, 0, 0, 0, 0, 0, 0,
+        50, 50, 50, 50, 50, 50, 50, 50,
+        10, 10, 20, 30, 30, 20, 10, 10,
+        5, 5, 10, 25, 25, 10, 5, 5,
+        0, 0, 0, 20, 20, 0, 0, 0,
+        5, -5, -10, 0, 0, -10, -5, 5,
+        5, 10, 10, -20, -20, 10, 10, 5,
+        0, 0, 0, 0, 0, 0, 0, 0
+    ],
+    chess.KNIGHT: [
+        -50, -40, -30, -30, -30, -30, -40, -50,
+        -40, -20, 0, 0, 0, 0, -20, -40,
+        -30, 0, 10, 15, 15, 10, 0, -30,
+        -30, 5, 15, 20, 20, 15, 5, -30,
+        -30, 0, 15, 20, 20, 15, 0, -30,
+        -30, 5, 10, 15, 15, 10, 5, -30,
+        -40, -20, 0, 5, 5, 0, -20, -40,
+        -50, -40, -30, -30, -30, -30, -40, -50
+    ],
+    chess.BISHOP: [
+        -20, -10, -10, -10, -10, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 10, 10, 5, 0, -10,
+        -10, 5, 5, 10, 10, 5, 5, -10,
+        -10, 0, 10, 10, 10, 10, 0, -10,
+        -10, 10, 10, 10, 10, 10, 10, -10,
+        -10, 5, 0, 0, 0, 0, 5, -10,
+        -20, -10, -10, -10, -10, -10, -10, -20
+    ],
+    chess.ROOK: [
+        0, 0, 0, 0, 0, 0, 0, 0,
+        5, 10, 10, 10, 10, 10, 10, 5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        0, 0, 0, 5, 5, 0, 0, 0
+    ],
+    chess.QUEEN: [
+        -20, -10, -10, -5, -5, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 5, 5, 5, 0, -10,
+        -5, 0, 5, 5, 5, 5, 0, -5,
+        0, 0, 5, 5, 5, 5, 0, -5,
+        -10, 5, 5, 5, 5, 5, 0, -10,
+        -10, 0, 5, 0, 0, 0, 0, -10,
+        -20, -10, -10, -5, -5, -10, -10, -20
+    ],
+    chess.KING: [
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -20, -30, -30, -40, -40, -30, -30, -20,
+        -10, -20, -20, -20, -20, -20, -20, -10,
+        20, 20, 0, 0, 0, 0, 20, 20,
+        20, 30, 10, 0, 0, 10, 30, 20
+    ]
+}
+
+# Score of every piece code on every square in centipawns, positive for white:
+# material (PIECE_VALUES * 100) plus the piece-square table, mirrored vertically for black
+SCORES = np.zeros((16, 64), dtype=np.int32)
+for _kind, _table in PIECE_SQUARE_TABLES.items():
+    _scores = 100 * chess.PIECE_VALUES[_kind] + np.array(_table, dtype=np.int32)
+    SCORES[_kind] = _scores
+    SCORES[_kind | chess.BLACK_BIT] = -_scores.reshape(8, 8)[::-1].reshape(64)
+# The same scores square by square, looked up with one take of 16*square + code
+_SQUARE_SCORES = np.ascontiguousarray(SCORES.T).ravel()
+_SQUARE_OFFSETS = 16 * np.arange(64)
+_SCORE_ROWS = SCORES.tolist()  # Python lists are faster than NumPy for a single position
+
+
+def to_array(states):
+    """
+    Packs positions into an array of piece codes
+        Parameters:
+            states (iterable of chess.State): The positions
+        Returns:
+            (np.ndarray): uint8 array of shape (N, 64), row i holds State.get_codes of the i-th position
+    """
+    return np.frombuffer(b"".join(state.get_codes() for state in states), dtype=np.uint8).reshape(-1, 64)
+
+
+def evaluate_batch(boards):
+    """
+    Evaluates many positions at once: material plus piece-square tables
+        Parameters:
+            boards (np.ndarray): Piece codes of shape (N, 64), see to_array
+        Returns:
+            (np.ndarray): int32 array of N evaluations in centipawns, positive if white is better
+    """
+    return np.take(_SQUARE_SCORES, _SQUARE_OFFSETS + boards).sum(axis=1, dtype=np.int32)
+
+
+def evaluate(state: chess.State):
+    """Evaluates one position the same way as evaluate_batch"""
+    return sum(_SCORE_ROWS[code][sq] for sq, code in enumerate(state.get_codes()) if code != chess.EMPTY)
@@ -6,9 +6,14 @@ import cProfile, pstats
 # game = chess.Game()
 # bot = chessbots.MinMaxBot(max_depth=2)
 
+# Built-in statistics: nodes, nps, branching factor, cutoffs, TT hit rate and the time split
+# bot = chessbots.AlphaBetaBot(time_limit=1.0, timing=True, info=lambda info: print(chessbots.format_info(info)))
+# bot.find_move(game.get_state())
+# print(bot.stats.as_dict())
+
 # profiler = cProfile.Profile()
 # profiler.enable()
-# bot._find_move(game.get_state())
+# bot.find_move(game.get_state())
 # profiler.disable()
 
 # stream = open("test.txt", "w")*
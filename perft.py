@@ -0,0 +1,154 @@
+import argparse
+import hashlib
+import json
+import platform
+import sys
+import time
+
+import chess
+
+
+# Standard perft positions with the expected number of leaf positions for depths 1, 2, ...
+# Promotions are always to a queen in this engine, so for positions where pawns promote
+# the counts are smaller than the published ones (which count all four pieces).
+POSITIONS = [
+    {"name": "initial", "depth": 4,
+     "fen": "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+     "expected": [20, 400, 8902, 197281, 4865609]},
+    {"name": "kiwipete", "depth": 3,
+     "fen": "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     "expected": [48, 2039, 97862, 4074224]},
+    {"name": "position3", "depth": 4,
+     "fen": "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     "expected": [14, 191, 2812, 43238, 674624]},
+    {"name": "position4", "depth": 3,
+     "fen": "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     "expected": [6, 228, 8087, 320802]},
+    {"name": "position5", "depth": 3,
+     "fen": "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     "expected": [41, 1373, 54007, 1806790]},
+    {"name": "illegal_ep_capture", "depth": 4,
+     "fen": "8/5bk1/8/2Pp4/8/1K6/8/8 w - d6 0 1",
+     "expected": [8, 104, 736, 9287, 61886]},
+    {"name": "ep_capture_checks", "depth": 4,
+     "fen": "8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1",
+     "expected": [15, 126, 1928, 13931, 206136]},
+    {"name": "short_castling_checks", "depth": 4,
+     "fen": "5k2/8/8/8/8/8/8/4K2R w K - 0 1",
+     "expected": [15, 66, 1198, 6399, 120330]},
+    {"name": "long_castling_checks", "depth": 4,
+     "fen": "3k4/8/8/8/8/8/8/R3K3 w Q - 0 1",
+     "expected": [16, 71, 1286, 7418, 141077]},
+    {"name": "castling_rights", "depth": 3,
+     "fen": "r3k2r/1b4bq/8/8/8/8/7B/R3K2R w KQkq - 0 1",
+     "expected": [26, 1141, 27826]},
+    {"name": "castling_prevented", "depth": 3,
+     "fen": "r3k2r/8/3Q4/8/8/5q2/8/R3K2R b KQkq - 0 1",
+     "expected": [44, 1494, 50509]},
+    {"name": "promotion_out_of_check", "depth": 4,
+     "fen": "2K2r2/4P3/8/8/8/8/8/3k4 w - - 0 1",
+     "expected": [5, 75, 694, 9674, 128641]},
+    {"name": "discovered_check", "depth": 3,
+     "fen": "8/8/1P2K3/8/2n5/1q6/8/5k2 b - - 0 1",
+     "expected": [29, 165, 5160, 30674]},
+    {"name": "promotion_checks", "depth": 5,
+     "fen": "4k3/1P6/8/8/8/8/K7/8 w - - 0 1",
+     "expected": [6, 28, 248, 1379, 18382]},
+    {"name": "self_stalemate", "depth": 6,
+     "fen": "K1k5/8/P7/8/8/8/8/8 w - - 0 1",
+     "expected": [2, 6, 13, 63, 331, 1924]},
+    {"name": "stalemate_checkmate", "depth": 5,
+     "fen": "8/k1P5/8/1K6/8/8/8/8 w - - 0 1",
+     "expected": [7, 19, 129, 498, 4217, 18519]},
+    {"name": "stalemate_checkmate_2", "depth": 3,
+     "fen": "8/8/2k5/5q2/5n2/8/5K2/8 b - - 0 1",
+     "expected": [37, 183, 6559]},
+]
+
+def run_position(position, depth, bitboards=False):
+    """
+    Runs perft on one position
+        Returns:
+            (dict): Result with node count, expected count (None if unknown), time and nodes per second
+    """
+    state = chess.State.from_fen(position["fen"], bitboards=bitboards)
+    start = time.perf_counter()
+    nodes = state.perft(depth)
+    seconds = time.perf_counter() - start
+    expected = position["expected"][depth - 1] if depth <= len(position["expected"]) else None
+    return {
+        "name": position["name"],
+        "fen": position["fen"],
+        "depth": depth,
+        "nodes": nodes,
+        "expected": expected,
+        "ok": expected is None or nodes == expected,
+        "seconds": seconds,
+        "nps": nodes / seconds if seconds > 0 else None
+    }
+
+
+def run_suite(positions=POSITIONS, depth=None, bitboards=False, verbose=True):
+    """
+    Runs perft on all positions
+        Parameters:
+            depth (int): Depth for every position (by default the "depth" of each position)
+            bitboards (bool): Whether to run on the bitboard core of State
+        Returns:
+            (dict): Report with the results of every position and the totals
+    """
+    with open(chess.__file__, "rb") as file:
+        chess_sha1 = hashlib.sha1(file.read()).hexdigest()
+    results = []
+    for position in positions:
+        res = run_position(position, depth or position["depth"], bitboards=bitboards)
+        results.append(res)
+        if verbose:
+            status = "ok" if res["ok"] else f"FAILED (expected {res['expected']})"
+            print(f"{res['name']:<24} depth {res['depth']}: {res['nodes']:>9} nodes "
+                  f"{res['seconds']:8.2f}s {res['nps']:10.0f} nps  {status}")
+    total_nodes = sum(res["nodes"] for res in results)
+    total_seconds = sum(res["seconds"] for res in results)
+    return {
+        "chess_sha1": chess_sha1,
+        "python": platform.python_version(),
+        "backend": "bitboards" if bitboards else "mailbox",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+        "total_nodes": total_nodes,
+        "total_seconds": total_seconds,
+        "nps": total_nodes / total_seconds if total_seconds > 0 else None,
+        "ok": all(res["ok"] for res in results)
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Perft correctness and speed benchmark for chess.State")
+    parser.add_argument("--depth", type=int, help="depth for every position (default: per position)")
+    parser.add_argument("--bitboards", action="store_true", help="run on the bitboard core")
+    parser.add_argument("--positions", nargs="*", help="names of the positions to run (default: all)")
+    parser.add_argument("--output", help="file to write the JSON report to")
+    parser.add_argument("--divide", help="FEN to print divide(depth) for, instead of running the suite")
+    args = parser.parse_args(argv)
+
+    if args.divide:
+        state = chess.State.from_fen(args.divide, bitboards=args.bitboards)
+        counts = state.divide(args.depth or 1)
+        for move, nodes in counts.items():
+            print(f"{move}: {nodes}")
+        print(f"Total: {sum(counts.values())}")
+        return 0
+
+    positions = POSITIONS
+    if args.positions:
+        positions = [position for position in POSITIONS if position["name"] in args.positions]
+    report = run_suite(positions, depth=args.depth, bitboards=args.bitboards)
+    print(f"Total: {report['total_nodes']} nodes in {report['total_seconds']:.2f}s, {report['nps']:.0f} nps")
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    return 0 if report["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+import re
+
+import chess
+
+
+# Tokens of PGN movetext; comments, annotations and variations are matched so that they can be skipped
+MOVETEXT_RE = re.compile(r"""
+    (\{[^}]*\}?)            # comment
+    | (;[^\n]*)             # comment till the end of the line
+    | (\$\d+)               # numeric annotation glyph
+    | ([()])                # start or end of a variation
+    | (1-0|0-1|1/2-1/2|\*)  # result
+    | (\d+\.+)              # move number
+    | ([^\s{}();$.]+)       # move
+""", re.VERBOSE)
+TAG_RE = re.compile(r'^\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+SEVEN_TAG_ROSTER = ["Event", "Site", "Date", "Round", "White", "Black", "Result"]
+
+
+class PGNGame:
+    """A game read from PGN: its tags, its moves in SAN and its result"""
+    def __init__(self, headers, moves, result="*"):
+        """
+            Parameters:
+                headers (dict): Tag pairs like {"White": "Carlsen, Magnus"}
+                moves ([str]): Moves of the main line in SAN
+                result (str): "1-0", "0-1", "1/2-1/2" or "*"
+        """
+        self.headers = headers
+        self.moves = moves
+        self.result = result
+
+    def get_start_state(self):
+        """Returns the position the game starts from: the FEN tag or the initial position"""
+        if "FEN" in self.headers:
+            return chess.State.from_fen(self.headers["FEN"])
+        return chess.State("initial")
+
+    def replay(self, validate=True):
+        """
+        Plays the moves of the game
+            Parameters:
+                validate (bool): Whether to check every move against the legal moves.
+                    Without it the moves are trusted, which is several times faster
+            Returns:
+                (chess.Game): Game with all the moves played
+        """
+        game = chess.Game(self.get_start_state())
+        for san in self.moves:
+            move = game.get_state().parse_san(san, validate=validate)
+            game.play_move(move, validate=False)  # parse_san has already checked the move
+        return game
+
+
+def _ends_in_comment(line, in_comment):
+    """Checks if a {comment} is still open at the end of a movetext line"""
+    pos = 0
+    while True:
+        pos = line.find("}" if in_comment else "{", pos)
+        if pos == -1:
+            return in_comment
+        in_comment = not in_comment
+        pos += 1
+
+
+def _parse_movetext(movetext):
+    """Returns the SAN moves of the main line and the result (None if it isn't written)"""
+    moves = []
+    result = None
+    variation_depth = 0
+    for comment, line_comment, nag, paren, res, number, san in MOVETEXT_RE.findall(movetext):
+        if paren == "(":
+            variation_depth += 1
+        elif paren == ")":
+            variation_depth -= 1
+        elif variation_depth > 0:
+            continue
+        elif san:
+            moves.append(san)
+        elif res:
+            result = res
+    return moves, result
+
+
+def read_games(file):
+    """
+    Reads the games of a PGN file one by one, keeping only the current game in memory
+        Parameters:
+            file (file object or iterable of str): Opened PGN file
+        Returns:
+            (generator of PGNGame): The games in the order of the file
+    """
+    headers = {}
+    movetext = []
+    in_comment = False
+    for line in file:
+        stripped = line.strip()
+        if not in_comment:
+            if stripped.startswith("["):
+                if movetext:
+                    # Tags after a movetext start the next game
+                    yield _make_game(headers, movetext)
+                    headers, movetext = {}, []
+                match = TAG_RE.match(stripped)
+                if match is not None:
+                    headers[match.group(1)] = match.group(2).replace('\\"', '"').replace("\\\\", "\\")
+                continue
+            if stripped.startswith("%"):  # Escaped line
+                continue
+        if stripped:
+            movetext.append(stripped)
+            # A line of a comment mustn't be taken for a tag
+            in_comment = _ends_in_comment(stripped, in_comment)
+    if headers or movetext:
+        yield _make_game(headers, movetext)
+
+
+def _make_game(headers, movetext):
+    moves, result = _parse_movetext("\n".join(movetext))
+    return PGNGame(headers, moves, result or headers.get("Result", "*"))
+
+
+def get_result(game: chess.Game):
+    """Returns the PGN result of a game: "1-0", "0-1", "1/2-1/2" or "*" if it isn't over"""
+    state = game.get_state()
+    if state.condition == chess.State.Condition.CHECKMATE:
+        return "0-1" if state.color_to_move == chess.Color.WHITE else "1-0"
+    if state.condition == chess.State.Condition.STALEMATE:
+        return "1/2-1/2"
+    return "*"
+
+
+def game_to_pgn(game: chess.Game, headers=None, line_length=80):
+    """
+    Writes a game in PGN
+        Parameters:
+            game (chess.Game): The game
+            headers (dict): Tags to write, the missing tags of the Seven Tag Roster are filled with "?"
+            line_length (int): Maximal length of the movetext lines
+        Returns:
+            (str): The game in PGN, ending with an empty line
+    """
+    headers = dict(headers) if headers is not None else {}
+    result = headers.setdefault("Result", get_result(game))
+    start = game.states[0]
+    if start != chess.State("initial"):
+        headers.setdefault("SetUp", "1")
+        headers.setdefault("FEN", start.to_fen())
+    tags = SEVEN_TAG_ROSTER + [tag for tag in headers if tag not in SEVEN_TAG_ROSTER]
+    lines = []
+    for tag in tags:
+        value = headers.get(tag, "????.??.??" if tag == "Date" else "?")
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+        lines.append(f'[{tag} "{value}"]')
+    lines.append("")
+
+    tokens = []
+    move_number = 1
+    white_to_move = start.color_to_move == chess.Color.WHITE
+    for ind, san in enumerate(game.get_san_history()):
+        if white_to_move:
+            tokens.append(f"{move_number}.")
+        elif ind == 0:
+            tokens.append(f"{move_number}...")
+        tokens.append(san)
+        if not white_to_move:
+            move_number += 1
+        white_to_move = not white_to_move
+    tokens.append(result)
+
+    line = ""
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > line_length:
+            lines.append(line)
+            line = token
+        else:
+            line = f"{line} {token}" if line else token
+    lines.append(line)
+    return "\n".join(lines) + "\n\n"
+
+
+def write_game(file, game: chess.Game, headers=None):
+    """Appends a game in PGN to an opened file"""
+    file.write(game_to_pgn(game, headers))
@@ -0,0 +1,368 @@
+import argparse
+import mmap
+import os
+import sys
+import time
+
+import numpy as np
+
+import chess
+
+
+# Letters of the pieces in a signature like "KRvK", in the order they are written
+SIGNATURE_KINDS = {"K": chess.KING, "Q": chess.QUEEN, "R": chess.ROOK, "B": chess.BISHOP,
+                   "N": chess.KNIGHT, "P": chess.PAWN}
+KIND_LETTERS = {kind: letter for letter, kind in SIGNATURE_KINDS.items()}
+# Stored values: 0 is a draw, an odd n > 0 a win in n plies, -n - 1 a loss in n plies (n even, -1 is mate)
+MAX_PLIES = 126
+
+
+def get_signature(state: chess.State):
+    """Returns the material of a position like "KQvK", white first, pieces by decreasing value"""
+    return _get_signature(state.get_codes())
+
+
+def _get_signature(codes):
+    sides = {0: [], chess.BLACK_BIT: []}
+    for code in codes:
+        if code != chess.EMPTY:
+            sides[code & chess.BLACK_BIT].append(code & chess.KIND_MASK)
+    return "v".join(
+        "".join(KIND_LETTERS[kind] for kind in sorted(sides[side], key=_kind_order)) for side in (0, chess.BLACK_BIT)
+    )
+
+
+def _kind_order(kind):
+    return "KQRBNP".index(KIND_LETTERS[kind])
+
+
+def _parse_signature(signature):
+    """Returns the piece codes of a signature in the order of the index: white king, white pieces, black ones"""
+    sides = signature.split("v")
+    if len(sides) != 2 or any(side.count("K") != 1 or not side.startswith("K") for side in sides):
+        raise ValueError(f"Invalid signature: {signature}")
+    codes = []
+    for side_bit, side in zip((0, chess.BLACK_BIT), sides):
+        for letter in side:
+            if letter not in SIGNATURE_KINDS:
+                raise ValueError(f"Invalid signature: {signature}")
+            codes.append(SIGNATURE_KINDS[letter] | side_bit)
+    return codes
+
+
+def _flip_signature(signature):
+    white, black = signature.split("v")
+    return f"{black}v{white}"
+
+
+def _is_canonical(signature):
+    """Of a signature and its color flipped version only the one with the stronger white side is stored"""
+    white, black = signature.split("v")
+    strength = [(sum(chess.PIECE_VALUES[SIGNATURE_KINDS[letter]] for letter in side), len(side), side)
+                for side in (white, black)]
+    return strength[0] >= strength[1]
+
+
+def _table_size(n_pieces):
+    # Side to move, the white king on the left half of the board (the rest is mirrored), the other pieces
+    return 2 * 32 * 64**(n_pieces - 1)
+
+
+def _get_index(squares, white_to_move):
+    """
+    Index of a position in its table
+        Parameters:
+            squares ([int]): Squares (x*8 + y) of the pieces in the order of the signature
+    """
+    if squares[0] % 8 >= 4:
+        squares = [sq ^ 7 for sq in squares]  # Mirrored left to right
+    ind = 0 if white_to_move else 1
+    ind = ind*32 + squares[0]//8*4 + squares[0] % 8
+    for sq in squares[1:]:
+        ind = ind*64 + sq
+    return ind
+
+
+def _get_squares(ind, n_pieces):
+    """Returns the squares of the pieces and whether white is to move, the inverse of _get_index"""
+    squares = []
+    for _ in range(n_pieces - 1):
+        ind, sq = divmod(ind, 64)
+        squares.append(sq)
+    ind, king = divmod(ind, 32)
+    squares.append(king//4*8 + king % 4)
+    squares.reverse()
+    return squares, ind == 0
+
+
+class Tablebase:
+    """
+    Endgame tables created with generate, one file per material signature in a directory.
+    A table has a signed byte for every position (see _get_index), the files are memory-mapped
+    when first needed. Castling isn't possible in the tables and en passant is ignored
+    """
+    def __init__(self, directory):
+        if not os.path.isdir(directory):
+            raise FileNotFoundError(f"{directory} is not a directory of endgame tables")
+        self.directory = directory
+        self.tables = {}
+
+    def close(self):
+        for table in self.tables.values():
+            if table is not None:
+                table.close()
+        self.tables = {}
+
+    def _get_table(self, signature):
+        if signature not in self.tables:
+            path = os.path.join(self.directory, signature + ".tb")
+            table = None
+            if os.path.exists(path):
+                with open(path, "rb") as file:
+                    if os.fstat(file.fileno()).st_size != _table_size(len(_parse_signature(signature))):
+                        raise ValueError(f"{path} has a wrong size")
+                    table = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.tables[signature] = table
+        return self.tables[signature]
+
+    def probe(self, state: chess.State):
+        """
+        Looks up the result of a position
+            Returns:
+                (result, plies) (tuple): 1 if the side to move wins, 0 for a draw, -1 if it loses;
+                    and the number of plies till mate with the best play of both sides (0 for a draw).
+                    None if the position isn't in the tables
+        """
+        value = self._probe_value(state)
+        if value is None:
+            return None
+        if value > 0:
+            return 1, value
+        if value < 0:
+            return -1, -value - 1
+        return 0, 0
+
+    def _probe_value(self, state: chess.State):
+        rights = state.castle_rights
+        if any(rights[color][side] for color in rights for side in rights[color]):
+            return None
+        board = state.get_codes()
+        signature = _get_signature(board)
+        if signature == "KvK":
+            return 0
+        white_to_move = state.color_to_move == chess.Color.WHITE
+        if state.en_peas_sqrs and "P" in signature.split("v")[0] and "P" in signature.split("v")[1]:
+            return None  # An en passant capture might be possible
+        if not _is_canonical(signature):
+            # The colors are swapped and the board turned upside down
+            signature = _flip_signature(signature)
+            board = [board[sq ^ 56] ^ chess.BLACK_BIT if board[sq ^ 56] else chess.EMPTY for sq in range(64)]
+            white_to_move = not white_to_move
+        table = self._get_table(signature)
+        if table is None:
+            return None
+        codes = _parse_signature(signature)
+        squares_by_code = {}
+        for sq, code in enumerate(board):
+            if code != chess.EMPTY:
+                squares_by_code.setdefault(code, []).append(sq)
+        squares = [squares_by_code[code].pop() for code in codes]
+        value = table[_get_index(squares, white_to_move)]
+        return value - 256 if value > 127 else value
+
+    def find_move(self, state: chess.State):
+        """
+        Returns the best move of a position in the tables (the quickest mate, a drawing move,
+        or the longest resistance), None if the position isn't in the tables or has no moves
+        """
+        if self._probe_value(state) is None:
+            return None
+        best_move, best_key = None, None
+        state = state.copy()
+        for move in state.get_possible_moves():
+            state.push(move)
+            value = self._probe_value(state)
+            state.pop()
+            if value is None:
+                return None
+            # Sort key from the point of view of the side which moves: losses of the opponent, quickest first,
+            # then draws, then wins of the opponent, slowest first
+            key = (2, value) if value < 0 else (1, 0) if value == 0 else (0, value)
+            if best_key is None or key > best_key:
+                best_move, best_key = move, key
+        return best_move
+
+
+def generate(signature, directory, verbose=True):
+    """
+    Creates the table of an endgame by retrograde analysis: every position is set up and its legal moves
+    are generated once, then the results spread backwards from the mates, one ply at a time.
+    Captures and promotions lead to smaller tables, which are created first if they are missing.
+    Three pieces take a few seconds to a minute, four pieces are too slow for Python
+        Parameters:
+            signature (str): Material like "KQvK", the side with more material first
+            directory (str): Directory of the tables
+        Returns:
+            (dict): Number of positions, wins, draws, losses, the longest mate in plies and the time taken
+    """
+    codes = _parse_signature(signature)
+    if not _is_canonical(signature):
+        raise ValueError(f"Signature {signature} has to start with the stronger side: {_flip_signature(signature)}")
+    os.makedirs(directory, exist_ok=True)
+    tablebase = Tablebase(directory)
+    start = time.perf_counter()
+    n_pieces = len(codes)
+    size = _table_size(n_pieces)
+    valid = bytearray(size)
+    move_counts = np.zeros(size, dtype=np.int32)
+    edges_from, edges_to = [], []
+    # Results of moves into smaller tables, as (plies till the mate after the move, whether the move wins, position)
+    exits = []
+    mates = []
+
+    state = chess.State.from_fen("8/8/8/8/8/8/8/8 w - - 0 1", bitboards=True)
+    for ind in range(size):
+        squares, white_to_move = _get_squares(ind, n_pieces)
+        if len(set(squares)) != n_pieces or any(
+                code & chess.KIND_MASK == chess.PAWN and sq // 8 in (0, 7) for sq, code in zip(squares, codes)):
+            continue
+        for sq, code in zip(squares, codes):
+            state.board[sq // 8, sq % 8] = chess.PIECES[code]
+        # The side which isn't to move mustn't be in check
+        state.color_to_move = chess.Color.BLACK if white_to_move else chess.Color.WHITE
+        if not state.is_check():
+            state.color_to_move = chess.Color.WHITE if white_to_move else chess.Color.BLACK
+            valid[ind] = 1
+            moves = state.get_possible_moves()
+            move_counts[ind] = len(moves)
+            if len(moves) == 0 and state.is_check():
+                mates.append(ind)
+            slots = {sq: slot for slot, sq in enumerate(squares)}
+            for move in moves:
+                x1, y1, x2, y2 = move
+                sq1, sq2 = x1*8 + y1, x2*8 + y2
+                slot = slots[sq1]
+                if sq2 in slots or (codes[slot] & chess.KIND_MASK == chess.PAWN and x2 in (0, 7)):
+                    # A capture or a promotion, the result is in a smaller table
+                    state.push(move)
+                    value = tablebase._probe_value(state)
+                    if value is None:
+                        generate(_child_signature(state), directory, verbose)
+                        tablebase.close()
+                        value = tablebase._probe_value(state)
+                    state.pop()
+                    if value < 0:
+                        exits.append((-value, True, ind))  # Mate in -value - 1 plies after the move
+                    elif value > 0:
+                        exits.append((value, False, ind))
+                    continue
+                child_squares = list(squares)
+                child_squares[slot] = sq2
+                edges_from.append(ind)
+                edges_to.append(_get_index(child_squares, not white_to_move))
+        for sq in squares:
+            state.board[sq // 8, sq % 8] = chess.PIECES[chess.EMPTY]
+    tablebase.close()
+
+    # The positions from which each position can be reached, as slices of predecessors
+    edges_from = np.array(edges_from, dtype=np.int64)
+    edges_to = np.array(edges_to, dtype=np.int64)
+    order = np.argsort(edges_to, kind="stable")
+    predecessors = edges_from[order].tolist()
+    starts = np.searchsorted(edges_to[order], np.arange(size + 1)).tolist()
+    del edges_from, edges_to, order
+
+    # Events are processed by plies: (position, True) makes the position a win, (position, False) a loss,
+    # (position, None) takes away one of the moves which don't lose for the opponent
+    events = {0: [(ind, False) for ind in mates]}
+    for plies, wins, ind in exits:
+        if wins:
+            events.setdefault(plies, []).append((ind, True))
+        else:
+            events.setdefault(plies, []).append((ind, None))
+    values = bytearray(size)
+    resolved = bytearray(size)
+    remaining = move_counts.tolist()
+    plies = 0
+    while events:
+        for ind, win in events.pop(plies, []):
+            if resolved[ind]:
+                continue
+            if win is None:
+                remaining[ind] -= 1
+                if remaining[ind] == 0:
+                    events.setdefault(plies + 1, []).append((ind, False))
+                continue
+            if plies > MAX_PLIES:
+                raise ValueError(f"Mates longer than {MAX_PLIES} plies can't be stored")
+            resolved[ind] = 1
+            values[ind] = plies if win else (-plies - 1) & 0xFF
+            for pred in predecessors[starts[ind]:starts[ind + 1]]:
+                if resolved[pred]:
+                    continue
+                if not win:
+                    events.setdefault(plies + 1, []).append((pred, True))
+                else:
+                    remaining[pred] -= 1
+                    if remaining[pred] == 0:
+                        events.setdefault(plies + 1, []).append((pred, False))
+        plies += 1
+
+    with open(os.path.join(directory, signature + ".tb"), "wb") as file:
+        file.write(values)
+    n_valid = sum(valid)
+    wins = sum(1 for value in values if 0 < value < 128)
+    losses = sum(1 for value in values if value >= 128)
+    stats = {
+        "signature": signature,
+        "positions": n_valid,
+        "wins": wins,
+        "draws": n_valid - wins - losses,
+        "losses": losses,
+        "longest_mate": max((value if value < 128 else 255 - value for value in values), default=0),
+        "seconds": time.perf_counter() - start
+    }
+    if verbose:
+        print(f"{signature}: {stats['positions']} positions, {stats['wins']} wins, {stats['draws']} draws, "
+              f"{stats['losses']} losses, longest mate {stats['longest_mate']} plies, "
+              f"{stats['seconds']:.1f}s", file=sys.stderr)
+    return stats
+
+
+def _child_signature(state: chess.State):
+    signature = get_signature(state)
+    return signature if _is_canonical(signature) else _flip_signature(signature)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Endgame tablebases")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    generate_parser = subparsers.add_parser("generate", help="create tables")
+    generate_parser.add_argument("directory", help="directory of the tables")
+    generate_parser.add_argument("signatures", nargs="+", help='endgames like "KQvK" (stronger side first)')
+    probe_parser = subparsers.add_parser("probe", help="print the result and the best move of a position")
+    probe_parser.add_argument("directory", help="directory of the tables")
+    probe_parser.add_argument("fen", help="position")
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        for signature in args.signatures:
+            generate(signature, args.directory)
+        return 0
+
+    state = chess.State.from_fen(args.fen)
+    tablebase = Tablebase(args.directory)
+    res = tablebase.probe(state)
+    if res is None:
+        print("Not in the tables")
+        return 1
+    result, plies = res
+    move = tablebase.find_move(state)
+    description = {1: f"win, mate in {plies} plies", 0: "draw", -1: f"loss, mated in {plies} plies"}[result]
+    print(f"{description}, best move: {state.move_to_san(move) if move is not None else '-'}")
+    tablebase.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
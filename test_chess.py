@@ -0,0 +1,35 @@
+import chess
+
+
+def test_board_view_len():
+    state = chess.State("initial")
+    assert len(state.board) == 8
+    assert all(len(row) == 8 for row in state.board)
+
+
+def test_en_passant_view():
+    state = chess.State("initial")
+    assert len(state.en_peas_sqrs) == 0
+    assert not state.en_peas_sqrs
+    assert state.en_peas_sqrs == []
+
+    state = chess.State.from_fen("rnbqkbnr/ppp1pppp/8/8/3pP3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1")
+    assert len(state.en_peas_sqrs) == 1
+    assert state.en_peas_sqrs == [(5, 4)]
+    state.en_peas_sqrs.clear()
+    assert not state.en_peas_sqrs
+    assert state.to_fen().split()[3] == "-"
+
+
+def test_zobrist_key_and_imbalance_after_moves():
+    state = chess.State("initial")
+    state.zobrist_key
+    state.push((6, 4, 4, 4))
+    state.push((1, 3, 3, 3))
+    state.push((4, 4, 3, 3))
+    fen_state = chess.State.from_fen(state.to_fen())
+    assert state.zobrist_key == fen_state.zobrist_key
+    assert state.get_imbalance() == fen_state.get_imbalance() == 1
+    state.pop()
+    assert state.get_imbalance() == 0
+    assert state.zobrist_key == chess.State.from_fen(state.to_fen()).zobrist_key
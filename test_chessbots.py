@@ -0,0 +1,40 @@
+import chess
+import chessbots
+import threading
+import time
+
+
+class WaitingBot(chessbots.Player):
+    """Thinks until it is stopped, recording whether each search was stopped and how many ran at once"""
+    def __init__(self):
+        super().__init__()
+        self.stopped = []
+        self.running = 0
+        self.most_running = 0
+        self.lock = threading.Lock()
+
+    def find_move(self, state):
+        with self.lock:
+            self.running += 1
+            self.most_running = max(self.most_running, self.running)
+        self.stopped.append(self.stop_event.wait(5))
+        with self.lock:
+            self.running -= 1
+        return state.get_possible_moves()[0]
+
+
+def test_cancelled_search_stays_stopped():
+    state = chess.State("initial")
+    bot = WaitingBot()
+    bot.request_move(state)
+    time.sleep(0.05)
+    bot.cancel()
+    future = bot.request_move(state)
+    time.sleep(0.05)
+    assert not future.done()
+    start = time.perf_counter()
+    bot.stop_event.set()
+    future.result(timeout=1)
+    assert time.perf_counter() - start < 1
+    assert bot.stopped == [True, True]
+    assert bot.most_running == 1
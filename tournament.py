@@ -0,0 +1,236 @@
+import argparse
+import ast
+import concurrent.futures
+import functools
+import itertools
+import json
+import math
+import multiprocessing
+import queue
+import sys
+import time
+
+import chess
+import chessbots
+
+
+def play_game(white: chessbots.Player, black: chessbots.Player, move_time=None, max_plies=300,
+              material_margin=None, start=None, grace=0.5):
+    """
+    Plays a game between two players without any window
+        Parameters:
+            move_time (float): Seconds a player has for a move (plus grace), None for no limit
+            max_plies (int): After this many plies the game is adjudicated
+            material_margin (int): At max_plies, the side ahead by at least this much material wins,
+                None to always adjudicate a draw
+            start (chess.State): Position to start from (by default the initial one)
+        Returns:
+            (dict): "result" ("1-0", "0-1" or "1/2-1/2"), "reason", "plies" and "moves" (like "e2-e4 e7-e5")
+    """
+    game = chess.Game(start)
+    result = reason = None
+    while result is None:
+        state = game.get_state()
+        if state.condition == chess.State.Condition.CHECKMATE:
+            result = "0-1" if state.color_to_move == chess.Color.WHITE else "1-0"
+            reason = "checkmate"
+            break
+        if state.condition == chess.State.Condition.STALEMATE:
+            result, reason = "1/2-1/2", "stalemate"
+            break
+        if game.move_counter >= max_plies:
+            imbalance = state.get_imbalance()
+            if material_margin is not None and abs(imbalance) >= material_margin:
+                result = "1-0" if imbalance > 0 else "0-1"
+            else:
+                result = "1/2-1/2"
+            reason = "move cap"
+            break
+
+        white_to_move = state.color_to_move == chess.Color.WHITE
+        player = white if white_to_move else black
+        loss = "0-1" if white_to_move else "1-0"
+        future = player.request_move(state.copy())
+        try:
+            move = future.result(timeout=move_time + grace if move_time is not None else None)
+        except concurrent.futures.TimeoutError:
+            player.cancel()
+            result, reason = loss, "time forfeit"
+            break
+        if move is None or not state.is_valid_move(move):
+            result, reason = loss, f"illegal move {move}"
+            break
+        game.play_move(move, validate=False)
+    return {"result": result, "reason": reason, "plies": game.move_counter, "moves": " ".join(game.history)}
+
+
+def _game_process(game_id, white_factory, black_factory, options, results):
+    start = time.perf_counter()
+    try:
+        res = play_game(white_factory(), black_factory(), **options)
+    except Exception as exc:
+        res = {"result": None, "reason": f"error: {exc!r}", "plies": 0, "moves": ""}
+    res["seconds"] = time.perf_counter() - start
+    results.put((game_id, res))
+
+
+def run_tournament(players, games_per_pair=2, processes=None, verbose=True, **options):
+    """
+    Plays a round robin, every game in its own process, so that a player which doesn't stop thinking
+    after its time ran out can be killed with the process
+        Parameters:
+            players (dict): Name of a player -> function creating it, like
+                {"ab": functools.partial(chessbots.AlphaBetaBot, time_limit=0.1)}
+            games_per_pair (int): Games of every pair of players, they take turns playing white
+            processes (int): Number of games played at the same time (by default one per CPU)
+            options: Arguments of play_game
+        Returns:
+            ([dict]): Results of play_game with "white" and "black" names added, in the order of the games
+    """
+    processes = processes or multiprocessing.cpu_count()
+    pairings = []
+    for name1, name2 in itertools.combinations(players, 2):
+        for ind in range(games_per_pair):
+            pairings.append((name1, name2) if ind % 2 == 0 else (name2, name1))
+
+    results = multiprocessing.Queue()
+    running = {}
+    finished = [None] * len(pairings)
+    next_game = 0
+    while next_game < len(pairings) or running:
+        while next_game < len(pairings) and len(running) < processes:
+            white, black = pairings[next_game]
+            proc = multiprocessing.Process(
+                target=_game_process, args=(next_game, players[white], players[black], options, results)
+            )
+            proc.start()
+            running[next_game] = proc
+            next_game += 1
+        try:
+            game_id, res = results.get(timeout=1)
+        except queue.Empty:
+            # A process which died without a result would otherwise be waited for forever
+            for game_id, proc in list(running.items()):
+                if not proc.is_alive() and proc.exitcode != 0:
+                    white, black = pairings[game_id]
+                    finished[game_id] = {"white": white, "black": black, "result": None,
+                                         "reason": f"crashed with exit code {proc.exitcode}",
+                                         "plies": 0, "moves": "", "seconds": 0.0}
+                    del running[game_id]
+            continue
+        proc = running.pop(game_id)
+        proc.join(timeout=1)
+        if proc.is_alive():  # A thread of a player is still searching
+            proc.terminate()
+            proc.join()
+        white, black = pairings[game_id]
+        finished[game_id] = dict(white=white, black=black, **res)
+        if verbose:
+            done = sum(res is not None for res in finished)
+            print(f"[{done}/{len(pairings)}] {white} - {black}: {res['result']} ({res['reason']}, "
+                  f"{res['plies']} plies, {res['seconds']:.1f}s)", file=sys.stderr)
+    return finished
+
+
+SCORES = {"1-0": (1.0, 0.0), "0-1": (0.0, 1.0), "1/2-1/2": (0.5, 0.5)}
+
+
+def get_standings(results):
+    """
+    Sums up the results of the games and estimates the Elo ratings of the players
+    (a Bradley-Terry model where a draw counts as half a win, every pair also gets one virtual draw,
+    so that ratings stay finite if a player wins or loses everything; the mean rating is 0)
+        Returns:
+            ({name: {"games", "points", "elo"}}) (dict): Standings, best player first
+    """
+    names = sorted({res["white"] for res in results} | {res["black"] for res in results})
+    points = {name: 0.0 for name in names}
+    games = {name: 0 for name in names}
+    pair_games = {}
+    for res in results:
+        if res["result"] not in SCORES:
+            continue
+        white_score, black_score = SCORES[res["result"]]
+        points[res["white"]] += white_score
+        points[res["black"]] += black_score
+        games[res["white"]] += 1
+        games[res["black"]] += 1
+        pair = tuple(sorted((res["white"], res["black"])))
+        pair_games[pair] = pair_games.get(pair, 0) + 1
+
+    # Virtual draws
+    wins = {name: points[name] + 0.5 * sum(name in pair for pair in pair_games) for name in names}
+    counts = {pair: n + 1 for pair, n in pair_games.items()}
+    strength = {name: 1.0 for name in names}
+    for _ in range(1000):
+        new_strength = {}
+        for name in names:
+            denominator = sum(
+                n / (strength[pair[0]] + strength[pair[1]]) for pair, n in counts.items() if name in pair
+            )
+            new_strength[name] = wins[name] / denominator if denominator > 0 else 1.0
+        mean_log = sum(math.log(s) for s in new_strength.values()) / len(names)
+        new_strength = {name: s / math.exp(mean_log) for name, s in new_strength.items()}
+        converged = all(abs(new_strength[name] - strength[name]) < 1e-9 for name in names)
+        strength = new_strength
+        if converged:
+            break
+
+    standings = {
+        name: {"games": games[name], "points": points[name], "elo": 400 * math.log10(strength[name])}
+        for name in names
+    }
+    return dict(sorted(standings.items(), key=lambda item: -item[1]["elo"]))
+
+
+def parse_player(spec):
+    """
+    Creates a player factory from a description like "AlphaBetaBot(time_limit=0.1, max_depth=4)"
+    (a class of chessbots with arguments given as Python literals)
+    """
+    call = ast.parse(spec if "(" in spec else spec + "()", mode="eval").body
+    if not isinstance(call, ast.Call) or not isinstance(call.func, ast.Name):
+        raise ValueError(f"Invalid player: {spec}")
+    cls = getattr(chessbots, call.func.id, None)
+    if not isinstance(cls, type) or not issubclass(cls, chessbots.Player):
+        raise ValueError(f"Unknown player: {call.func.id}")
+    args = [ast.literal_eval(arg) for arg in call.args]
+    kwargs = {keyword.arg: ast.literal_eval(keyword.value) for keyword in call.keywords}
+    return functools.partial(cls, *args, **kwargs)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Round robin of chessbots players without a window")
+    parser.add_argument("players", nargs="+", help='players like "AlphaBetaBot(time_limit=0.1)"')
+    parser.add_argument("--games", type=int, default=2, help="games of every pair of players")
+    parser.add_argument("--processes", type=int, help="games played at the same time (default: one per CPU)")
+    parser.add_argument("--move-time", type=float, help="seconds per move before a player loses on time")
+    parser.add_argument("--max-plies", type=int, default=300, help="plies after which a game is adjudicated")
+    parser.add_argument("--material-margin", type=int,
+                        help="material advantage which wins an adjudicated game (default: a draw)")
+    parser.add_argument("--output", help="JSONL file for the results of the games")
+    args = parser.parse_args(argv)
+
+    if len(set(args.players)) != len(args.players) or len(args.players) < 2:
+        parser.error("at least two different players are needed")
+    players = {spec: parse_player(spec) for spec in args.players}
+    start = time.perf_counter()
+    results = run_tournament(
+        players, games_per_pair=args.games, processes=args.processes, move_time=args.move_time,
+        max_plies=args.max_plies, material_margin=args.material_margin
+    )
+    seconds = time.perf_counter() - start
+
+    if args.output:
+        with open(args.output, "w") as file:
+            for res in results:
+                file.write(json.dumps(res) + "\n")
+    print(f"{'player':<40} {'games':>5} {'points':>7} {'elo':>7}")
+    for name, row in get_standings(results).items():
+        print(f"{name:<40} {row['games']:>5} {row['points']:>7.1f} {row['elo']:>7.0f}")
+    print(f"{len(results)} games in {seconds:.1f}s: {len(results)/seconds:.2f} games/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+import argparse
+import os
+import sys
+import threading
+
+# Standard output is for the protocol only, pygame (imported by chess) mustn't greet there
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import book
+import chess
+import chessbots
+import tablebase
+
+
+ENGINE_NAME = "AmevinLS Chess AlphaBetaBot"
+ENGINE_AUTHOR = "AmevinLS"
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+
+def get_time_limit(params, white_to_move, overhead=0.05):
+    """
+    Returns the seconds to search for from the parameters of "go", None for no time limit
+        Parameters:
+            params (dict): Values of "go" like {"wtime": 60000, "winc": 1000} (in milliseconds)
+            overhead (float): Seconds kept for the communication with the GUI
+    """
+    if "movetime" in params:
+        return max(0.01, params["movetime"] / 1000 - overhead)
+    remaining = params.get("wtime" if white_to_move else "btime")
+    if remaining is None:
+        return None
+    increment = params.get("winc" if white_to_move else "binc", 0)
+    moves_to_go = params.get("movestogo", 30)
+    # An equal share of the remaining time plus most of the increment, but never more than half of what's left
+    limit = (remaining / moves_to_go + 0.8 * increment) / 1000
+    return max(0.01, min(limit, remaining / 2000) - overhead)
+
+
+class UCIEngine:
+    """
+    Speaks the Universal Chess Interface: reads commands line by line and writes the answers to output.
+    The search runs on the worker thread of the bot, so that "stop" and "isready" are answered while it runs
+    """
+    def __init__(self, output=sys.stdout):
+        self.output = output
+        self.output_lock = threading.Lock()
+        self.tt = chessbots.TranspositionTable()
+        self.bot = chessbots.AlphaBetaBot(time_limit=1.0, tt=self.tt, info=self._send_info)
+        self.state = chess.State("initial")
+        self.search = None
+        self.search_done = threading.Event()  # Set once the best move of the search has been sent
+        # Under "go infinite" the best move is only sent after "stop", until then it waits here
+        self.infinite = False
+        self.held_move = None
+        self.search_lock = threading.Lock()
+
+    def send(self, line):
+        with self.output_lock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    def _send_info(self, info):
+        self.send(chessbots.format_info(info))
+
+    def handle(self, line):
+        """
+        Executes one command
+            Returns:
+                (bool): False after "quit"
+        """
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+        if command == "uci":
+            self.send(f"id name {ENGINE_NAME}")
+            self.send(f"id author {ENGINE_AUTHOR}")
+            self.send("option name BookFile type string default <empty>")
+            self.send("option name TablebasePath type string default <empty>")
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "ucinewgame":
+            self.stop()
+            self.tt.clear()
+            self.bot.orderer.clear()
+            self.state = chess.State("initial")
+        elif command == "setoption":
+            self.set_option(args)
+        elif command == "position":
+            self.stop()
+            self.set_position(args)
+        elif command == "go":
+            self.stop()
+            self.go(args)
+        elif command == "stop":
+            self.stop()
+        elif command == "quit":
+            self.stop()
+            return False
+        else:
+            self.send(f"info string unknown command {command}")
+        return True
+
+    def set_option(self, args):
+        """Handles "setoption name <name> value <value>" """
+        if "name" not in args:
+            return
+        value_ind = args.index("value") if "value" in args else len(args)
+        name = " ".join(args[args.index("name") + 1:value_ind])
+        value = " ".join(args[value_ind + 1:])
+        if value in ("", "<empty>"):
+            value = None
+        try:
+            if name == "BookFile":
+                self.bot.book = book.OpeningBook(value) if value is not None else None
+            elif name == "TablebasePath":
+                self.bot.tablebase = tablebase.Tablebase(value) if value is not None else None
+            else:
+                self.send(f"info string unknown option {name}")
+        except (OSError, ValueError) as exc:
+            self.send(f"info string can't set {name}: {exc}")
+
+    def set_position(self, args):
+        """Handles "position startpos|fen <fen> [moves <move> ...]" """
+        moves_ind = args.index("moves") if "moves" in args else len(args)
+        if args and args[0] == "fen":
+            fen = " ".join(args[1:moves_ind])
+        else:
+            fen = START_FEN
+        try:
+            state = chess.State.from_fen(fen)
+            for uci in args[moves_ind + 1:]:
+                state.push(state.parse_uci(uci))
+        except (ValueError, chess.BadMoveError) as exc:
+            self.send(f"info string invalid position: {exc}")
+            return
+        self.state = state
+
+    def go(self, args):
+        """Handles "go" with movetime, wtime, btime, winc, binc, movestogo, depth, nodes or infinite"""
+        params = {}
+        for name, value in zip(args, args[1:]):
+            if name in ("movetime", "wtime", "btime", "winc", "binc", "movestogo", "depth", "nodes"):
+                try:
+                    params[name] = int(value)
+                except ValueError:
+                    self.send(f"info string invalid value of {name}: {value}")
+                    return
+        self.infinite = "infinite" in args
+        white_to_move = self.state.color_to_move == chess.Color.WHITE
+        self.bot.time_limit = None if self.infinite else get_time_limit(params, white_to_move)
+        self.bot.max_depth = params.get("depth")
+        self.bot.max_nodes = params.get("nodes")
+        self.bot.stats = chessbots.SearchStats()  # Stays empty if the move comes from the book or the tables
+        state = self.state.copy()
+        self.search_done.clear()
+        try:
+            self.search = self.bot.request_move(state)
+        except (OSError, ValueError) as exc:
+            # The book or the tables are broken, a move is still owed
+            self.send(f"info string searching without the book and the tables: {exc}")
+            self.bot.book = self.bot.tablebase = None
+            self.search = self.bot.request_move(state)
+        self.search.add_done_callback(lambda future: self._send_best_move(future, state))
+
+    def _send_best_move(self, future, state):
+        try:
+            move = future.result()
+        except Exception as exc:
+            self.send(f"info string search failed: {exc!r}")
+            move = None
+        with self.search_lock:
+            if self.infinite and not self.bot.stop_event.is_set():
+                # The search ended by itself (a mate or the depth limit), but the GUI waits for "stop"
+                self.held_move = (state, move)
+                return
+        self._finish_search(state, move)
+
+    def _finish_search(self, state, move):
+        stats = self.bot.stats
+        self.send(f"info depth {stats.depth} nodes {stats.nodes} nps {stats.nps:.0f} "
+                  f"time {stats.seconds * 1000:.0f}")
+        self.send(f"bestmove {state.move_to_uci(move) if move is not None else '0000'}")
+        self.search_done.set()
+
+    def stop(self):
+        """Ends a running search and waits till its best move (the best found so far) is sent"""
+        if self.search is not None:
+            with self.search_lock:
+                self.bot.stop_event.set()
+                held_move, self.held_move = self.held_move, None
+            if held_move is not None:
+                self._finish_search(*held_move)
+            self.search_done.wait()
+            self.search = None
+
+    def run(self, input=sys.stdin):
+        for line in input:
+            try:
+                if not self.handle(line):
+                    return
+            except Exception as exc:
+                # A GUI can't do anything with a traceback, the engine reports the error and goes on
+                self.send(f"info string error in {line.strip()!r}: {exc!r}")
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="UCI engine, for chess GUIs and tournament managers")
+    parser.add_argument("--book", help="Polyglot opening book")
+    parser.add_argument("--tablebase", help="directory of endgame tables")
+    args = parser.parse_args(argv)
+    engine = UCIEngine()
+    if args.book:
+        engine.set_option(["name", "BookFile", "value", args.book])
+    if args.tablebase:
+        engine.set_option(["name", "TablebasePath", "value", args.tablebase])
+    engine.run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())